@@ -1,24 +1,141 @@
-from functools import cache
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from tortoise.queryset import QuerySet
+
+from api.api_v1.storage.database import Database, COUNT_STRATEGIES
+from api.api_v1.storage.cache import cached_response, response_cache
+from api.api_v1.storage.coalescer import create_coalescer
+from api.api_v1.storage.idempotency import idempotent, HEADER as IDEMPOTENCY_HEADER
+from api.api_v1.storage.filters import parse as parse_filter, OPERATORS
+from api.api_v1.settings import (
+    BULK_CHUNK_SIZE,
+    BULK_MAX_ITEMS,
+    EXPORT_CHUNK_SIZE,
+    MAX_PAGE_SIZE,
+    WRITE_COALESCING,
+)
+from api.api_v1.responses import (
+    FastJSONResponse,
+    fast_json_response,
+    ndjson_stream,
+    csv_stream,
+)
+from api.utils import API_functools
+from api.api_v1.models.pydantic import (
+    User,
+    PartialUser,
+    PartialUserWithID,
+    deliverable,
+    undeliverable_emails,
+)
+from api.api_v1.models.tortoise import Person, Person_Pydantic, PERSON_FIELDS
+
+router = APIRouter(default_response_class=FastJSONResponse)
+
+INVALID_FIELDS = f"Invalid fields. Try with: {('id',) + User.attributes()}"
+INVALID_FILTER = f"""
+            Invalid attribute filter.
+            Try with: {User.attributes()}
+            """
+INVALID_FILTER_VALUE = "Invalid filter value"
+INVALID_OPERATOR = f"Invalid filter operator. Try with: {OPERATORS}"
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
-from fastapi import APIRouter, Request, Response, status
 
-from api.api_v1.storage.database import Database
-from api.utils import API_functools
-from api.api_v1.models.pydantic import User, PartialUser
-from api.api_v1.models.tortoise import Person, Person_Pydantic
+def _selected_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Attributes to select for the fields query parameter\n
+
+    Args:\n
+        fields (Optional[str]): comma separated attributes or None\n
+    Returns:\n
+        Optional[Tuple[str, ...]]: attributes, all of them if fields \
+        is empty, None if invalid\n
+    """
+    return API_functools.valid_fields(User, fields) if fields else PERSON_FIELDS
+
+
+def _invalid_page(
+    limit: int, offset: int, max_limit: Optional[int] = None
+) -> Optional[str]:
+    """Check limit and offset of paginated user lists\n
+
+    Args:\n
+        limit (int): max number of returned users\n
+        offset (int): first user to return\n
+        max_limit (Optional[int], optional): largest limit accepted. \
+        Defaults to None (no maximum).\n
+    Returns:\n
+        Optional[str]: error detail, None if valid\n
+    """
+    if offset < 0 or limit < 1:
+        return "Invalid values: offset(>=0) or limit(>0)"
+    if max_limit is not None and limit > max_limit:
+        return f"Invalid limit. Maximum page size is {max_limit}"
+    return None
+
+
+def _invalid_filter(user_attribute: str) -> Optional[str]:
+    """Check the attribute filter of users_by_attribute\n
+
+    Args:\n
+        user_attribute (str): attribute(s) with optional :operator \
+        combined with Or, And\n
+    Returns:\n
+        Optional[str]: error detail, None if valid\n
+    """
+    plan = parse_filter(user_attribute)
+    attributes = plan.attributes()
+    if not attributes or not all(
+        API_functools.is_attribute_of(attr, User) for attr in attributes
+    ):
+        return INVALID_FILTER
+    if any(cond.operator not in OPERATORS for cond in plan.conditions()):
+        return INVALID_OPERATOR
+    return None
+
+
+async def _reject_undeliverable(
+    users: Dict[int, Dict[str, Any]], results: List[Dict[str, Any]]
+) -> None:
+    """Move users whose email is undeliverable from users to results \
+    (errors), deliverability is checked off the event loop\n
 
-router = APIRouter()
+    Args:\n
+        users (Dict[int, Dict[str, Any]]): valid users by request index\n
+        results (List[Dict[str, Any]]): result of each user in request order\n
+    """
+    undeliverable = await undeliverable_emails(user["email"] for user in users.values())
+    for index, user in list(users.items()):
+        if user["email"] in undeliverable:
+            del users[index]
+            results[index] = {
+                "index": index,
+                "success": False,
+                "detail": [
+                    {
+                        "loc": ["email"],
+                        "msg": "email is not a valid email address.",
+                        "type": "value_error",
+                    }
+                ],
+            }
 
 
-@cache
 @router.get("/", status_code=status.HTTP_200_OK)
+@fast_json_response(status.HTTP_200_OK)
+@cached_response(response_cache)
 async def users(
     request: Request,
     res: Response,
     limit: Optional[int] = 20,
     offset: Optional[int] = 0,
     sort: Optional[str] = "id:asc",
+    cursor: Optional[str] = None,
+    count: Optional[str] = "exact",
+    include_total: Optional[bool] = True,
+    fields: Optional[str] = None,
 ) -> Optional[List[Dict[str, Any]]]:
     """Get all users or some of them using 'offset' and 'limit'\n
 
@@ -30,6 +147,17 @@ async def users(
         sort (str, optional): the order of the result. \
         attribute:(asc {ascending} or desc {descending}). \
         Defaults to "id:asc".\n
+        cursor (str, optional): keyset pagination, replaces offset. \
+        Send an empty cursor to get the first page then follow \
+        next/previous links. The cursor keeps the sort of the first page. \
+        Defaults to None.\n
+        count (str, optional): how the X-Total-Count header is computed. \
+        exact, cached (short-lived) or estimated (database statistics). \
+        Defaults to "exact".\n
+        include_total (bool, optional): count users. Defaults to True.\n
+        fields (str, optional): comma separated attributes to return, \
+        the ID is always returned. ex: first_name,last_name. \
+        Defaults to None (all attributes).\n
     Returns:\n
         Optional[List[Dict[str, Any]]]: list of users found or \
         Dict with error\n
@@ -47,16 +175,40 @@ async def users(
             attribute:order. ex: id:asc or id:desc",
         }
 
-    if offset < 0 or limit < 1:
+    page_error = _invalid_page(limit, offset)
+    if page_error is not None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": page_error}
+    selected = _selected_fields(fields)
+    if selected is None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": INVALID_FIELDS}
+    if count not in COUNT_STRATEGIES:
         res.status_code = status.HTTP_400_BAD_REQUEST
         return {
             **response,
-            "detail": "Invalid values: offset(>=0) or limit(>0)",
+            "detail": f"Invalid count strategy. Try with: {COUNT_STRATEGIES}",
         }
-    nb_users = await Person.all().count()
 
-    users = await Person_Pydantic.from_queryset(
-        Person.all().limit(limit).offset(offset).order_by(order_by)
+    nb_users = None
+    if include_total:
+        nb_users = await Database.count(Person, count)
+        res.headers["X-Total-Count"] = str(nb_users)
+        if count != "exact":
+            # an approximate total can't be used to build next/previous links
+            nb_users = None
+
+    if cursor is not None:
+        return await _users_by_cursor(
+            request, res, Person.all(), limit, order_by, cursor, selected
+        )
+
+    users = (
+        await Person.all()
+        .limit(limit + 1)
+        .offset(offset)
+        .order_by(order_by)
+        .values(*selected)
     )
 
     if len(users) == 0:
@@ -64,90 +216,545 @@ async def users(
         return {**response, "detail": "Not Found"}
 
     return API_functools.manage_next_previous_page(
-        request, users, nb_users, limit, offset
+        request, users[:limit], nb_users, limit, offset, has_more=len(users) > limit
+    )
+
+
+async def _users_by_cursor(
+    request: Request,
+    res: Response,
+    queryset: QuerySet,
+    limit: int,
+    order_by: str,
+    cursor: str,
+    selected: Tuple[str, ...],
+) -> Dict[str, Any]:
+    """Get a page of users using keyset pagination
+        called by users and users_by_attribute functions\n
+
+    Args:\n
+        queryset (QuerySet): users to paginate\n
+        limit (int): max number of returned users\n
+        order_by (str): valid order, used for the first page only\n
+        cursor (str): cursor from next/previous link or empty string\n
+        selected (Tuple[str, ...]): attributes to return\n
+    Returns:\n
+        Dict[str, Any]: users found with next/previous cursor links \
+        or Dict with error\n
+    """
+    response = {"success": False, "users": []}
+    position = None
+    if cursor:
+        position = API_functools.decode_cursor(User, cursor)
+        if position is None:
+            res.status_code = status.HTTP_400_BAD_REQUEST
+            return {**response, "detail": "Invalid cursor"}
+        order_by = position["order_by"]
+
+    try:
+        queryset = Database.keyset_paginate(queryset, order_by, limit + 1, position)
+    except (ValueError, TypeError):
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": "Invalid cursor"}
+    # the sort attribute is needed to build cursors
+    sort_attr = order_by.lstrip("-")
+    extra = () if sort_attr in selected else (sort_attr,)
+    users = await queryset.values(*selected, *extra)
+
+    if len(users) == 0:
+        res.status_code = status.HTTP_404_NOT_FOUND
+        return {**response, "detail": "Not Found"}
+
+    has_more = len(users) > limit
+    users = users[:limit]
+    if position is not None and position["backwards"]:
+        users.reverse()
+    response = API_functools.manage_next_previous_page(
+        request,
+        users,
+        None,
+        limit,
+        None,
+        order_by=order_by,
+        position=position,
+        has_more=has_more,
+    )
+    for attr in extra:
+        for user in users:
+            del user[attr]
+    return response
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_users(
+    res: Response,
+    export_format: Optional[str] = Query("ndjson", alias="format"),
+    sort: Optional[str] = "id:asc",
+    fields: Optional[str] = None,
+    user_attribute: Optional[str] = None,
+    value: Optional[str] = None,
+) -> Response:
+    """Stream all users, or users matching a filter, as NDJSON or CSV\n
+
+    Args:\n
+        format (str, optional): ndjson or csv. Defaults to "ndjson".\n
+        sort (str, optional): the order of the result. \
+        attribute:(asc {ascending} or desc {descending}). \
+        Defaults to "id:asc".\n
+        fields (str, optional): comma separated attributes to return. \
+        Defaults to None (all attributes).\n
+        user_attribute (str, optional): filter attribute(s), \
+        same syntax as /filter/{user_attribute}/{value}. Defaults to None.\n
+        value (str, optional): filter value. Defaults to None.\n
+    Returns:\n
+        Response: streamed users or Dict with error\n
+    """
+    response = {"success": False, "users": []}
+    if export_format not in EXPORT_FORMATS:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            **response,
+            "detail": f"Invalid format. Try with: {tuple(EXPORT_FORMATS)}",
+        }
+    order_by = API_functools.valid_order(User, sort)
+    if order_by is None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            **response,
+            "detail": "Invalid sort parameters. it must match \
+            attribute:order. ex: id:asc or id:desc",
+        }
+    selected = _selected_fields(fields)
+    if selected is None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": INVALID_FIELDS}
+
+    queryset = Person.all()
+    if user_attribute is not None:
+        filter_error = (
+            INVALID_FILTER if value is None else _invalid_filter(user_attribute)
+        )
+        if filter_error is not None:
+            res.status_code = status.HTTP_400_BAD_REQUEST
+            return {**response, "detail": filter_error}
+        try:
+            queryset = Person.filter(
+                *Database.query_filter_builder(user_attribute, value)
+            )
+        except ValueError:
+            res.status_code = status.HTTP_400_BAD_REQUEST
+            return {**response, "detail": INVALID_FILTER_VALUE}
+
+    rows = Database.iterate_chunks(queryset, order_by, selected, EXPORT_CHUNK_SIZE)
+    if export_format == "csv":
+        content = csv_stream(rows, selected)
+    else:
+        content = ndjson_stream(rows)
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=users.{export_format}"},
     )
 
 
-@cache
 @router.get("/{user_ID}", status_code=status.HTTP_200_OK)
-async def users_by_ID(res: Response, user_ID: int) -> Dict[str, Any]:
+@fast_json_response(status.HTTP_200_OK)
+@cached_response(response_cache)
+async def users_by_ID(
+    request: Request, res: Response, user_ID: int, fields: Optional[str] = None
+) -> Dict[str, Any]:
     """Get user by ID\n
 
     Args:\n
         user_ID (int): user ID\n
+        fields (str, optional): comma separated attributes to return. \
+        Defaults to None (all attributes).\n
     Returns:\n
         Dict[str, Any]: contains user found\n
     """
-    user = await Person_Pydantic.from_queryset(Person.filter(pk=user_ID))
+    selected = _selected_fields(fields)
+    if selected is None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {"success": False, "user": {}, "detail": INVALID_FIELDS}
+
+    user = await Person.filter(pk=user_ID).values(*selected)
     data = {
         "success": True,
         "user": API_functools.get_or_default(user, 0, {}),
     }
-    if not API_functools.instance_of(data["user"], Person):
+    if not user:
         res.status_code = status.HTTP_404_NOT_FOUND
         data["success"] = False
         data["detail"] = "Not Found"
     return data
 
 
-@cache
 @router.get("/filter/{user_attribute}/{value}", status_code=status.HTTP_200_OK)
+@fast_json_response(status.HTTP_200_OK)
+@cached_response(response_cache)
 async def users_by_attribute(
-    res: Response, user_attribute: Any, value: Any
-) -> List[Dict[str, Any]]:
+    request: Request,
+    res: Response,
+    user_attribute: Any,
+    value: Any,
+    limit: Optional[int] = 20,
+    offset: Optional[int] = 0,
+    sort: Optional[str] = "id:asc",
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
     """Get user by attribute except ID attribute\n
 
     Args:
         user_attribute (Any): user's attribute\n
         you can combine two or more attributes
         with keywords "Or", "And"\n
-        ex: first_nameOrlast_name, genderAndemail
+        ex: first_nameOrlast_name, genderAndemail\n
+        each attribute contains value, or is compared with it \
+        using attribute:operator: eq, startswith, in (comma separated \
+        values), gt, gte, lt, lte or range (two comma separated values)\n
+        ex: email:eq, date_of_birth:range, is_admin:eq, gender:in
+        limit (int, optional): max number of returned users. \
+        Defaults to 20.\n
+        offset (int, optional): first user to return (use with limit). \
+        Defaults to 0.\n
+        sort (str, optional): the order of the result. \
+        attribute:(asc {ascending} or desc {descending}). \
+        Defaults to "id:asc".\n
+        cursor (str, optional): keyset pagination, replaces offset. \
+        Defaults to None.\n
+        fields (str, optional): comma separated attributes to return\n
 
     Returns:
-        List[Dict[str, Any]]: List of users found
+        Dict[str, Any]: page of users found with next/previous links
     """
     response = {"success": False, "users": []}
-    lower_user_attribute = user_attribute.lower()
-    if (
-        "and" not in lower_user_attribute and "or" not in lower_user_attribute
-    ) and not API_functools.is_attribute_of(user_attribute, User):
+    filter_error = _invalid_filter(user_attribute)
+    if filter_error is not None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": filter_error}
+    order_by = API_functools.valid_order(User, sort)
+    if order_by is None:
         res.status_code = status.HTTP_400_BAD_REQUEST
         return {
             **response,
-            "detail": f"""
-            Invalid attribute filter.
-            Try with: {User.attributes()}
-            """,
+            "detail": "Invalid sort parameters. it must match \
+            attribute:order. ex: id:asc or id:desc",
         }
-    query_builder = Database.query_filter_builder(user_attribute, value)
-
-    persons = await Person_Pydantic.from_queryset(
-        Person.filter(*query_builder).order_by("id")
+    page_error = _invalid_page(limit, offset, MAX_PAGE_SIZE)
+    if page_error is not None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": page_error}
+    selected = _selected_fields(fields)
+    if selected is None:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": INVALID_FIELDS}
+    try:
+        queryset = Person.filter(*Database.query_filter_builder(user_attribute, value))
+    except ValueError:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {**response, "detail": INVALID_FILTER_VALUE}
+
+    if cursor is not None:
+        page = await _users_by_cursor(
+            request, res, queryset, limit, order_by, cursor, selected
+        )
+        return page if "detail" in page else {"success": True, **page}
+
+    # the ID breaks ties so pages don't overlap
+    persons = (
+        await queryset.limit(limit + 1)
+        .offset(offset)
+        .order_by(order_by, "id")
+        .values(*selected)
     )
     if len(persons) == 0:
         res.status_code = status.HTTP_404_NOT_FOUND
         return {**response, "detail": "Not Found"}
 
-    return {"success": True, "users": persons}
+    page = API_functools.manage_next_previous_page(
+        request, persons[:limit], None, limit, offset, has_more=len(persons) > limit
+    )
+    return {"success": True, **page}
 
 
 @router.post("/", response_model=Person_Pydantic, status_code=status.HTTP_201_CREATED)
-async def create_user(user: User) -> Dict[str, Any]:
+@idempotent(status.HTTP_201_CREATED, response_model=Person_Pydantic)
+async def create_user(
+    request: Request,
+    res: Response,
+    user: User = Depends(deliverable(User)),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Dict[str, Any]:
     """Create new user\n
 
     Args:\n
         user (User): User to create\n
+        idempotency_key (Optional[str]): retries sent with the same key \
+        replay the first response instead of creating the user again\n
 
     Returns:\n
         Dict[str, Any]: User created\n
     """
-    user = await Person.create(**user.__dict__)
-    return user
+    data = user.dict()
+    if WRITE_COALESCING:
+        # written with the other concurrent creates in one INSERT
+        user_ID = await create_coalescer.insert(data)
+    else:
+        user_ID = (await Person.create(**data)).id
+    Database.invalidate_count(Person)
+    response_cache.clear()
+    return {"id": user_ID, **data}
+
+
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+@fast_json_response(status.HTTP_201_CREATED)
+async def create_users(res: Response, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Create many users with a few multi-row INSERT statements\n
+
+    Args:\n
+        users (List[Dict[str, Any]]): Users to create, \
+        each one is validated as User\n
+
+    Returns:\n
+        Dict[str, Any]: one result per user in request order: \
+        created user or validation errors\n
+    """
+    if len(users) > BULK_MAX_ITEMS:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "results": [],
+            "detail": f"Too many users. Maximum is {BULK_MAX_ITEMS}",
+        }
+    results: List[Dict[str, Any]] = [None] * len(users)
+    valid, errors = User.validate_many(users)
+    for index, detail in errors.items():
+        results[index] = {"index": index, "success": False, "detail": detail}
+    await _reject_undeliverable(valid, results)
+
+    # emails are unique: stored ones and repeated ones can't be inserted
+    emails = [user["email"] for user in valid.values()]
+    taken = set()
+    for chunk in Database.chunks(emails, BULK_CHUNK_SIZE):
+        stored = await Person.filter(email__in=chunk).values_list("email", flat=True)
+        taken.update(email.lower() for email in stored)
+    for index, user in list(valid.items()):
+        if user["email"] in taken:
+            del valid[index]
+            results[index] = {
+                "index": index,
+                "success": False,
+                "detail": [
+                    {
+                        "loc": ["email"],
+                        "msg": "email already exists.",
+                        "type": "value_error.duplicate",
+                    }
+                ],
+            }
+        taken.add(user["email"])
+
+    ids = await Database.insert_many(Person, list(valid.values()), BULK_CHUNK_SIZE)
+    for (index, user), user_ID in zip(valid.items(), ids):
+        results[index] = {
+            "index": index,
+            "success": True,
+            "user": {"id": user_ID, **user},
+        }
+    if ids:
+        Database.invalidate_count(Person)
+        response_cache.clear()
+    else:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+    return {"success": len(ids) == len(users), "created": len(ids), "results": results}
+
+
+@router.put("/by-email", status_code=status.HTTP_200_OK)
+@fast_json_response(status.HTTP_200_OK)
+async def upsert_users(res: Response, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Create or update many users keyed by email (case insensitive) \
+    with a few INSERT ... ON CONFLICT DO UPDATE statements\n
+
+    Args:\n
+        users (List[Dict[str, Any]]): Users to create or update, \
+        each one is validated as User, the last user of a repeated email is kept\n
+
+    Returns:\n
+        Dict[str, Any]: one result per user in request order: \
+        stored user or errors\n
+    """
+    if len(users) > BULK_MAX_ITEMS:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "results": [],
+            "detail": f"Too many users. Maximum is {BULK_MAX_ITEMS}",
+        }
+    results: List[Dict[str, Any]] = [None] * len(users)
+    parsed, errors = User.validate_many(users)
+    for index, detail in errors.items():
+        results[index] = {"index": index, "success": False, "detail": detail}
+    await _reject_undeliverable(parsed, results)
+
+    # a statement can't update a row twice: one user per email
+    valid: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    for index, user in parsed.items():
+        if user["email"] in valid:
+            repeated, _ = valid[user["email"]]
+            results[repeated] = {
+                "index": repeated,
+                "success": False,
+                "detail": [
+                    {
+                        "loc": ["email"],
+                        "msg": "email repeated, the last user is kept.",
+                        "type": "value_error.duplicate",
+                    }
+                ],
+            }
+        valid[user["email"]] = (index, user)
+
+    rows = sorted(valid.values(), key=lambda row: row[0])
+    ids = await Database.upsert_many(Person, [user for _, user in rows], BULK_CHUNK_SIZE)
+    for (index, user), user_ID in zip(rows, ids):
+        results[index] = {
+            "index": index,
+            "success": True,
+            "user": {"id": user_ID, **user},
+        }
+    if ids:
+        Database.invalidate_count(Person)
+        response_cache.clear()
+    else:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+    return {"success": len(ids) == len(users), "upserted": len(ids), "results": results}
+
+
+@router.put("/by-email/{email}", status_code=status.HTTP_200_OK)
+async def upsert_user(
+    res: Response, email: str, user: User = Depends(deliverable(User))
+) -> Dict[str, Any]:
+    """Create or update the user with this email (case insensitive) \
+    with one INSERT ... ON CONFLICT DO UPDATE statement\n
+
+    Args:\n
+        email (str): email of the user to create or update\n
+        user (User): user data, with the same email\n
+
+    Returns:\n
+        Dict[str, Any]: contains stored User or error\n
+    """
+    if user.email != email.strip().lower():
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "user": {},
+            "detail": "The user email must be the email of the path.",
+        }
+    data = user.dict()
+    [user_ID] = await Database.upsert_many(Person, [data], 1)
+    Database.invalidate_count(Person)
+    response_cache.clear()
+    return {"success": True, "user": {"id": user_ID, **data}}
+
+
+@router.patch("/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def fix_users(res: Response, users: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fix some attributes of many users according to PartialUser class, \
+    with a few set-based UPDATE statements in one transaction\n
+
+    Args:\n
+        users (List[Dict[str, Any]]): user ID and new data of each user, \
+        each one is validated as PartialUserWithID, the last data of a \
+        repeated ID is kept\n
+
+    Returns:\n
+        Dict[str, Any]: updated IDs, missing IDs and validation errors \
+        of each invalid user or error\n
+    """
+    if len(users) > BULK_MAX_ITEMS:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "updated": [],
+            "missing": [],
+            "errors": [],
+            "detail": f"Too many users. Maximum is {BULK_MAX_ITEMS}",
+        }
+    results: List[Dict[str, Any]] = [None] * len(users)
+    valid, errors = PartialUserWithID.validate_many(users)
+    for index, detail in errors.items():
+        results[index] = {"index": index, "success": False, "detail": detail}
+    await _reject_undeliverable(valid, results)
+
+    # only the attributes sent are written, as PATCH /users/{user_ID} does
+    rows = {
+        user["id"]: {name: value for name, value in user.items() if name in users[index]}
+        for index, user in valid.items()
+    }
+    updated = set(
+        await Database.update_many(
+            Person, list(rows.values()), PartialUser.attributes(), BULK_CHUNK_SIZE
+        )
+    )
+    errors = [result for result in results if result is not None]
+    if updated:
+        response_cache.clear()
+    elif errors:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+    else:
+        res.status_code = status.HTTP_404_NOT_FOUND
+    return {
+        "success": len(updated) == len(rows) and not errors,
+        "updated": [user_ID for user_ID in rows if user_ID in updated],
+        "missing": [user_ID for user_ID in rows if user_ID not in updated],
+        "errors": errors,
+    }
+
+
+@router.delete("/bulk", status_code=status.HTTP_202_ACCEPTED)
+async def delete_users(res: Response, ids: str) -> Dict[str, Any]:
+    """Delete many users with a few set-based DELETE statements \
+    in one transaction\n
+
+    Args:\n
+        ids (str): comma separated IDs of users to delete. ex: 1,2,3\n
+
+    Returns:\n
+        Dict[str, Any]: deleted IDs and missing IDs or error\n
+    """
+    try:
+        user_IDs = list(dict.fromkeys(int(user_ID) for user_ID in ids.split(",")))
+    except ValueError:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {"success": False, "detail": "Invalid ids. ex: ids=1,2,3"}
+    if len(user_IDs) > BULK_MAX_ITEMS:
+        res.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "success": False,
+            "deleted": [],
+            "missing": [],
+            "detail": f"Too many users. Maximum is {BULK_MAX_ITEMS}",
+        }
+
+    deleted = set(await Database.delete_many(Person, user_IDs, BULK_CHUNK_SIZE))
+    if deleted:
+        Database.invalidate_count(Person)
+        response_cache.clear()
+    else:
+        res.status_code = status.HTTP_404_NOT_FOUND
+    return {
+        "success": len(deleted) == len(user_IDs),
+        "deleted": [user_ID for user_ID in user_IDs if user_ID in deleted],
+        "missing": [user_ID for user_ID in user_IDs if user_ID not in deleted],
+    }
 
 
-@cache
 @router.patch("/{user_ID}", status_code=status.HTTP_202_ACCEPTED)
-async def fix_user(res: Response, user_ID: int, user: PartialUser) -> Dict[str, Any]:
+async def fix_user(
+    res: Response, user_ID: int, user: PartialUser = Depends(deliverable(PartialUser))
+) -> Dict[str, Any]:
     """Fix some user attributes according to PartialUser class\n
 
     Args:\n
@@ -165,20 +772,23 @@ async def fix_user(res: Response, user_ID: int, user: PartialUser) -> Dict[str,
     than the tortoiseORM validator in my opinion
     see: https://pydantic-docs.helpmanual.io/usage/validators/
     """
-    user_found = await Person.get_or_none(id=user_ID)
-    if user_found is None:
+    # one UPDATE ... RETURNING, only the attributes sent are written
+    user_updated = await Database.update_returning(
+        Person, user_ID, user.dict(exclude_unset=True)
+    )
+    if user_updated is None:
         res.status_code = status.HTTP_404_NOT_FOUND
         response["detail"] = f"User with ID {user_ID} doesn't exist."
         return response
 
-    user_updated = user_found.update_from_dict({**user.__dict__, "id": user_found.id})
-    await user_updated.save()
+    response_cache.clear()
     return await Person_Pydantic.from_tortoise_orm(user_updated)
 
 
-@cache
 @router.put("/{user_ID}", status_code=status.HTTP_202_ACCEPTED)
-async def update_user(res: Response, user_ID: int, new_data: User) -> Dict[str, Any]:
+async def update_user(
+    res: Response, user_ID: int, new_data: User = Depends(deliverable(User))
+) -> Dict[str, Any]:
     """Update user attributes according to User class\n
 
     Args:\n
@@ -190,15 +800,14 @@ async def update_user(res: Response, user_ID: int, new_data: User) -> Dict[str,
     """
     response = {"success": False, "user": {}}
 
-    # check if user exists
-    curr_user = await Person.get_or_none(id=user_ID)
+    # one UPDATE ... RETURNING, a missing user updates no row
+    curr_user = await Database.update_returning(Person, user_ID, new_data.dict())
     if curr_user is None:
         res.status_code = status.HTTP_404_NOT_FOUND
         response["detail"] = f"User with ID {user_ID} doesn't exist."
         return response
 
-    curr_user = await curr_user.update_from_dict(new_data.__dict__)
-    await curr_user.save()
+    response_cache.clear()
     return await Person_Pydantic.from_tortoise_orm(curr_user)
 
 
@@ -214,17 +823,17 @@ async def delete_user(res: Response, user_ID: int) -> Dict[str, Any]:
     """
     response = {"success": False, "user": {}}
 
-    user_found = await Person.get_or_none(id=user_ID)
+    # one DELETE ... RETURNING, a missing user deletes no row
+    user_found = await Database.delete_returning(Person, user_ID)
     if not user_found:
         res.status_code = status.HTTP_404_NOT_FOUND
         response["detail"] = f"User with ID {user_ID} doesn't exist"
         return response
 
-    await user_found.delete()
+    Database.invalidate_count(Person)
+    response_cache.clear()
 
     response["success"] = True
-    response["user"] = user_found.__dict__
-    response["user"].pop("_partial", None)
-    response["user"].pop("_saved_in_db", None)
+    response["user"] = user_found
     response["detail"] = f"User {user_ID} delete successfully ⭐"
     return response
@@ -1,13 +1,236 @@
 import re
+import asyncio
 from datetime import date
-from typing import Optional
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, ClassVar, Dict, Iterable, List, Optional, Tuple, Type
 
-from pydantic import BaseModel, validator
-from email_validator import validate_email, EmailNotValidError
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError, validator
+from pydantic.error_wrappers import ErrorWrapper
+from email_validator import validate_email, EmailNotValidError, EmailUndeliverableError
 
 from api.api_v1.models.types import Gender
+from api.api_v1.storage.cache import TTLCache
+from api.api_v1.settings import (
+    EMAIL_CACHE_MAXSIZE,
+    EMAIL_DNS_CACHE_TTL,
+    EMAIL_DNS_WORKERS,
+    EMAIL_OFFLINE,
+)
 
 avatar = "https://robohash.org/autdoloremaccusamus.png?size=150x150&set=set1"
+URL_PATTERN = re.compile(
+    r"(https?:\/\/(www\.)?|(www\.))([\w\-\_\.]+)(\.[a-z]{2,10})(\/.+)?"
+)
+# lowercase ASCII emails that email_validator accepts (dot-atom local part,
+# hostname labels without "--", letters only TLD), the others are validated
+EMAIL_PATTERN = re.compile(
+    r"(?=.{1,254}\Z)(?=[^@]{1,64}@)[a-z0-9_+-]+(?:\.[a-z0-9_+-]+)*"
+    r"@(?:(?=[a-z0-9-]{1,63}\.)[a-z0-9]+(?:-[a-z0-9]+)*\.)+[a-z]{2,63}\Z"
+)
+# deliverability checks (blocking DNS lookups), off the event loop
+_dns_executor = ThreadPoolExecutor(
+    max_workers=EMAIL_DNS_WORKERS, thread_name_prefix="email-dns"
+)
+# deliverability results by email, DNS records change: they expire
+deliverability_cache = TTLCache(maxsize=EMAIL_CACHE_MAXSIZE, ttl=EMAIL_DNS_CACHE_TTL)
+_UNCHECKED = object()
+
+
+@lru_cache(maxsize=EMAIL_CACHE_MAXSIZE)
+def email_error(email: str) -> Optional[str]:
+    """Validate an email syntax with email_validator, results are cached\n
+
+    Args:
+        email (str): email to validate
+
+    Returns:
+        Optional[str]: error, None if valid
+    """
+    try:
+        validate_email(email, check_deliverability=False)
+    except EmailNotValidError as e:
+        return str(e)
+    return None
+
+
+def deliverability_error(email: str) -> Tuple[Optional[str], bool]:
+    """Check an email deliverability with email_validator (blocking DNS \
+        queries), results aren't cached\n
+
+    Args:
+        email (str): email to check
+
+    Returns:
+        Tuple[Optional[str], bool]: error (None if deliverable) and whether \
+            the result can be cached, False if the lookup failed (timeout, \
+            resolver or network error)
+    """
+    try:
+        validated = validate_email(email, check_deliverability=True)
+    except EmailUndeliverableError as e:
+        # email_validator reports resolver errors as undeliverable emails too
+        return str(e), "error while checking" not in str(e)
+    except EmailNotValidError as e:
+        return str(e), True
+    # no MX (or A/AAAA fallback) record: the lookup timed out
+    return None, getattr(validated, "mx", None) is not None
+
+
+async def undeliverable_emails(emails: Iterable[str]) -> Dict[str, str]:
+    """Check emails deliverability in the DNS thread pool, results are \
+        cached for EMAIL_DNS_CACHE_TTL seconds, skipped if EMAIL_OFFLINE\n
+
+    Args:
+        emails (Iterable[str]): emails with a valid syntax
+
+    Returns:
+        Dict[str, str]: error of each undeliverable email
+    """
+    if EMAIL_OFFLINE:
+        return {}
+    results = {
+        email: deliverability_cache.get(email, _UNCHECKED)
+        for email in dict.fromkeys(emails)
+    }
+    unchecked = [email for email, error in results.items() if error is _UNCHECKED]
+    loop = asyncio.get_running_loop()
+    checks = await asyncio.gather(
+        *(
+            loop.run_in_executor(_dns_executor, deliverability_error, email)
+            for email in unchecked
+        )
+    )
+    for email, (error, cacheable) in zip(unchecked, checks):
+        results[email] = error
+        if cacheable:
+            deliverability_cache.set(email, error)
+    return {email: error for email, error in results.items() if error is not None}
+
+
+# column checks of validate_many: the value each validator would return,
+# _INVALID if the row must go through the model validation
+_INVALID = object()
+_MISSING = object()
+GENDERS = {gender.value: gender for gender in Gender}
+
+
+def _check_lengths(column: List[Any]) -> List[Any]:
+    """Check str values with 3 to 50 characters (spaces stripped), \
+        as between_3_and_50_characters\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: value of each item, _INVALID if rejected
+    """
+    return [
+        value if type(value) is str and 3 <= len(value.strip()) <= 50 else _INVALID
+        for value in column
+    ]
+
+
+def _check_urls(column: List[Any]) -> List[Any]:
+    """Check urls matching URL_PATTERN, as valid_url_avatar\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: lowered and stripped url of each item, _INVALID if rejected
+    """
+    lowered = [value.strip().lower() if type(value) is str else "" for value in column]
+    return [
+        value if match is not None else _INVALID
+        for value, match in zip(lowered, map(URL_PATTERN.match, lowered))
+    ]
+
+
+def _check_emails(column: List[Any]) -> List[Any]:
+    """Check emails syntax with EMAIL_PATTERN, email_error for the others, \
+        as valid_email\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: lowered and stripped email of each item, _INVALID if rejected
+    """
+    lowered = [value.strip().lower() if type(value) is str else "" for value in column]
+    return [
+        value if match is not None or email_error(value) is None else _INVALID
+        for value, match in zip(lowered, map(EMAIL_PATTERN.match, lowered))
+    ]
+
+
+def _check_genders(column: List[Any]) -> List[Any]:
+    """Check Gender value strings (ex: "Male")\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: Gender of each item, _INVALID if rejected
+    """
+    return [
+        GENDERS.get(value, _INVALID) if type(value) is str else _INVALID
+        for value in column
+    ]
+
+
+def _iso_date(value: Any) -> Any:
+    """Convert an ISO format (YYYY-MM-DD) string to date\n
+
+    Args:
+        value (Any): date or string to convert
+
+    Returns:
+        Any: date, _INVALID if rejected
+    """
+    if type(value) is date:
+        return value
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return _INVALID
+
+
+def _check_dates(column: List[Any]) -> List[Any]:
+    """Check dates and ISO format (YYYY-MM-DD) strings\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: date of each item, _INVALID if rejected
+    """
+    return list(map(_iso_date, column))
+
+
+def _check_booleans(column: List[Any]) -> List[Any]:
+    """Check bool values, the others (ex: "yes") are left to parse_obj\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: value of each item, _INVALID if rejected
+    """
+    return [value if type(value) is bool else _INVALID for value in column]
+
+
+def _check_integers(column: List[Any]) -> List[Any]:
+    """Check int values, the others (ex: "1", True) are left to parse_obj\n
+
+    Args:
+        column (List[Any]): values of a field, None excluded
+
+    Returns:
+        List[Any]: value of each item, _INVALID if rejected
+    """
+    return [value if type(value) is int else _INVALID for value in column]
 
 
 class PartialUser(BaseModel):
@@ -18,6 +241,16 @@ class PartialUser(BaseModel):
     company: Optional[str]
     job: Optional[str]
 
+    # column check of each field, see validate_many
+    batch_checks: ClassVar[Dict[str, Callable]] = {
+        "first_name": _check_lengths,
+        "last_name": _check_lengths,
+        "email": _check_emails,
+        "avatar": _check_urls,
+        "company": _check_lengths,
+        "job": _check_lengths,
+    }
+
     @classmethod
     def attributes(cls):
         """Return class object attributes except ID\n
@@ -27,22 +260,119 @@ class PartialUser(BaseModel):
         """
         return tuple(cls.__dict__.get("__fields__", {}).keys())
 
+    @classmethod
+    def trusted(cls, data: Dict[str, Any]) -> "PartialUser":
+        """Build the model from trusted data, without validation\n
+
+        Public API for code holding data already validated or generated
+        (scripts, loaders, the rows returned by validate_many), the app
+        endpoints validate their payloads and don't call it.
+
+        Args:
+            data (Dict[str, Any]): valid attribute values, with the field \
+                types (ex: User.dict() output)
+
+        Returns:
+            PartialUser: model, same as parse_obj would build from valid data
+        """
+        return cls.construct(**data)
+
+    @classmethod
+    def validate_many(
+        cls, rows: List[Any]
+    ) -> Tuple[Dict[int, Dict[str, Any]], Dict[int, List[Dict[str, Any]]]]:
+        """Validate many payloads (ex: bulk endpoints, imports) one column \
+            at a time instead of one model at a time\n
+
+        Columns are checked with the field validators rules (length bounds,
+        url pattern, email syntax, Gender membership, ...), the rows these
+        checks can't accept are validated with parse_obj, so values and
+        errors are the same as a parse_obj call per row.
+
+        Args:
+            rows (List[Any]): payloads to validate
+
+        Returns:
+            Tuple[Dict[int, Dict[str, Any]], Dict[int, List[Dict[str, Any]]]]: \
+                dict() of each valid row and errors() of each invalid row, \
+                by row index
+        """
+        required = [name for name, field in cls.__fields__.items() if field.required]
+        batch = [
+            index
+            for index, row in enumerate(rows)
+            if type(row) is dict and all(name in row for name in required)
+        ]
+        checked = cls._check_columns([rows[index] for index in batch])
+        valid = {batch[position]: values for position, values in checked.items()}
+        errors = {}
+        for index, row in enumerate(rows):
+            if index not in valid:
+                try:
+                    valid[index] = cls.parse_obj(row).dict()
+                except ValidationError as e:
+                    errors[index] = e.errors()
+        return dict(sorted(valid.items())), errors
+
+    @classmethod
+    def _check_columns(cls, rows: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """Check rows one column at a time with batch_checks
+            called by validate_many function\n
+
+        Args:
+            rows (List[Dict[str, Any]]): payloads with every required attribute
+
+        Returns:
+            Dict[int, Dict[str, Any]]: dict() of each row accepted by all \
+                the column checks, by row position
+        """
+        accepted = [True] * len(rows)
+        columns = {}
+        for name, field in cls.__fields__.items():
+            check = cls.batch_checks.get(name)
+            if check is None:
+                return {}
+            column = [row.get(name, _MISSING) for row in rows]
+            # missing and None values are left as is, None is rejected if not allowed
+            present = [
+                position
+                for position, value in enumerate(column)
+                if value is not None and value is not _MISSING
+            ]
+            for position, value in zip(present, check([column[p] for p in present])):
+                column[position] = value
+            for position, value in enumerate(column):
+                if value is _INVALID or (value is None and not field.allow_none):
+                    accepted[position] = False
+            columns[name] = column
+        return {
+            position: {
+                name: field.get_default()
+                if columns[name][position] is _MISSING
+                else columns[name][position]
+                for name, field in cls.__fields__.items()
+            }
+            for position, ok in enumerate(accepted)
+            if ok
+        }
+
     @validator("last_name", "first_name", "job", "company")
-    def between_3_and_50_characters(cls, value: str, **kwargs) -> str:
+    def between_3_and_50_characters(cls, value: Optional[str], **kwargs) -> Optional[str]:
         """Validate str attributes that must contains minimum 3 characters\
             and maximum 50 characters\n
 
         Args:\n
-            value (str): attribute to validate
+            value (Optional[str]): attribute to validate, None if unset
 
         Raises:
             ValueError: if constraint not respected
 
         Returns:
-            str: validate attribute
+            Optional[str]: validate attribute
         """
-        str_to_validate = value.title().strip()
-        if not (3 <= len(str_to_validate) <= 50):
+        if value is None:
+            return value
+        if not (3 <= len(value.strip()) <= 50):
             raise ValueError(
                 f"{kwargs['field'].name} must contain between 3 and 50 \
                     characters."
@@ -50,25 +380,22 @@ class PartialUser(BaseModel):
         return value
 
     @validator("avatar")
-    def valid_url_avatar(cls, value: str, **kwargs) -> str:
+    def valid_url_avatar(cls, value: Optional[str], **kwargs) -> Optional[str]:
         """Validate url\n
 
         Args:\n
-            value (str): url avatar to validate
+            value (Optional[str]): url avatar to validate, None if unset
 
         Raises:
             ValueError: if constraint not respected
 
         Returns:
-            str: validate attribute
+            Optional[str]: validate attribute
         """
-        value = value.title().strip().lower()
-        patt = r"(https?:\/\/(www\.)?|(www\.))([\w\-\_\.]+)(\.[a-z]{2,10})(\/.+)?"
-        result = re.match(
-            patt,
-            value,
-        )
-        if result is None:
+        if value is None:
+            return value
+        value = value.strip().lower()
+        if URL_PATTERN.match(value) is None:
             raise ValueError(f"{kwargs['field'].name} must be a valid url.")
         return value
 
@@ -85,12 +412,11 @@ class PartialUser(BaseModel):
         Returns:
             [str]: email
         """
-        value = value.title().strip()
-        try:
-            validate_email(value)
-        except EmailNotValidError:
+        value = value.strip().lower()
+        # syntax only, deliverability is checked off the event loop (see deliverable)
+        if email_error(value) is not None:
             raise ValueError(f"{kwargs['field'].name} is not a valid email address.")
-        return value.lower()
+        return value
 
     class Config:
         schema_extra = {
@@ -105,15 +431,32 @@ class PartialUser(BaseModel):
         }
 
 
+class PartialUserWithID(PartialUser):
+    id: int
+
+    batch_checks: ClassVar[Dict[str, Callable]] = {
+        **PartialUser.batch_checks,
+        "id": _check_integers,
+    }
+
+
 class User(PartialUser):
     is_admin: Optional[bool] = False
     gender: Gender
     date_of_birth: date
     country_of_birth: str
 
+    batch_checks: ClassVar[Dict[str, Callable]] = {
+        **PartialUser.batch_checks,
+        "is_admin": _check_booleans,
+        "gender": _check_genders,
+        "date_of_birth": _check_dates,
+        "country_of_birth": _check_lengths,
+    }
+
     @validator("country_of_birth")
-    def between_3_and_50_characters(cls, value: str) -> Optional[str]:
-        return super().between_3_and_50_characters(value)
+    def between_3_and_50_characters(cls, value: str, **kwargs) -> Optional[str]:
+        return super().between_3_and_50_characters(value, **kwargs)
 
     class Config:
         schema_extra = {
@@ -130,3 +473,33 @@ class User(PartialUser):
                 "country_of_birth": "No where",
             }
         }
+
+
+def deliverable(model: Type[PartialUser]) -> Callable:
+    """Build a request body dependency: model validation, then email \
+        deliverability checked in the DNS thread pool\n
+
+        @router.post("/")
+        async def endpoint(user: User = Depends(deliverable(User))): ...
+
+    Args:
+        model (Type[PartialUser]): request body model
+
+    Returns:
+        Callable: dependency returning the validated body, \
+            raises RequestValidationError (422) if the email is undeliverable
+    """
+
+    async def dependency(user: model) -> model:
+        if await undeliverable_emails([user.email]):
+            raise RequestValidationError(
+                [
+                    ErrorWrapper(
+                        ValueError("email is not a valid email address."),
+                        loc=("body", "email"),
+                    )
+                ]
+            )
+        return user
+
+    return dependency
@@ -28,5 +28,7 @@ class Person(models.Model):
 
 
 Person_Pydantic = pydantic_model_creator(Person, name="Person")
+# columns returned by the API, in Person_Pydantic order
+PERSON_FIELDS = tuple(Person_Pydantic.__fields__.keys())
 # PersonIn_Pydantic = pydantic_model_creator(
 #     Person, name="PersonIn", exclude_readonly=True)
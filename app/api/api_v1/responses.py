@@ -0,0 +1,145 @@
+import io
+import csv
+import json
+from enum import Enum
+from datetime import date
+from functools import wraps
+from typing import Any, AsyncIterator, Callable, Dict, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def json_default(obj: Any) -> Any:
+    """Serialize objects the JSON encoder doesn't know\n
+
+    Args:
+        obj (Any): pydantic model, enum (ex: Gender) or date
+
+    Raises:
+        TypeError: if obj isn't serializable
+
+    Returns:
+        Any: serializable value
+    """
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {obj.__class__.__name__} is not JSON serializable")
+
+
+def json_dumps(content: Any) -> bytes:
+    """Serialize content to compact JSON with orjson (stdlib json if not installed)\n
+
+    Args:
+        content (Any): content to serialize
+
+    Returns:
+        bytes: same bytes as JSONResponse would render
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=json_default)
+    return json.dumps(
+        content,
+        default=json_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (stdlib json if not installed),
+    pydantic models, dates and enums are serialized without jsonable_encoder.
+    Output bytes are the same as JSONResponse's.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+def fast_json_response(status_code: int = status.HTTP_200_OK) -> Callable:
+    """Render endpoint content with FastJSONResponse, skipping the
+       jsonable_encoder step FastAPI runs on returned content\n
+
+    The endpoint must take a `res: Response` parameter, its status code
+    and headers are copied to the rendered response.
+
+    Args:
+        status_code (int, optional): status code if the endpoint \
+            doesn't set one. Defaults to 200.
+
+    Returns:
+        Callable: endpoint decorator
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Response:
+            content = await endpoint(*args, **kwargs)
+            if isinstance(content, Response):
+                return content
+            res = kwargs["res"]
+            response = FastJSONResponse(
+                content, status_code=res.status_code or status_code
+            )
+            response.headers.raw.extend(
+                (key, value) for key, value in res.headers.raw if key != b"content-length"
+            )
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+async def ndjson_stream(rows: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Serialize rows as newline delimited JSON\n
+
+    Args:
+        rows (AsyncIterator[Dict[str, Any]]): rows to serialize
+
+    Yields:
+        bytes: one JSON document per row
+    """
+    async for row in rows:
+        yield json_dumps(row) + b"\n"
+
+
+async def csv_stream(
+    rows: AsyncIterator[Dict[str, Any]], fields: Tuple[str, ...]
+) -> AsyncIterator[str]:
+    """Serialize rows as CSV lines, headed by fields\n
+
+    Args:
+        rows (AsyncIterator[Dict[str, Any]]): rows to serialize
+        fields (Tuple[str, ...]): columns
+
+    Yields:
+        str: one CSV line per row
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(fields)
+    async for row in rows:
+        yield line(
+            json_default(value) if isinstance(value, (Enum, date)) else value
+            for value in row.values()
+        )
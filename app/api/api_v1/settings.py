@@ -2,17 +2,34 @@ import os
 
 
 TORTOISE_TEST_DB = "sqlite://tests/test-{}.sqlite3"
+
+# asyncpg connection pool: connections opened at startup and at most, queries
+# before a connection is replaced, seconds before an idle connection is closed,
+# prepared statements cached per connection (0 behind pgbouncer in transaction
+# mode), seconds before a query is cancelled (0: no timeout)
+DATABASE_POOL = {
+    "minsize": int(os.getenv("DATABASE_POOL_MINSIZE", 1)),
+    "maxsize": int(os.getenv("DATABASE_POOL_MAXSIZE", 10)),
+    "max_queries": int(os.getenv("DATABASE_MAX_QUERIES", 50000)),
+    "max_inactive_connection_lifetime": float(
+        os.getenv("DATABASE_MAX_IDLE_LIFETIME", 300)
+    ),
+    "statement_cache_size": int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", 100)),
+    "command_timeout": float(os.getenv("DATABASE_COMMAND_TIMEOUT", 0)) or None,
+}
+
 TORTOISE_ORM = {
     "connections": {
         "default": {
             "engine": "tortoise.backends.asyncpg",
             "credentials": {
-                # set ENV variable
+                # set ENV variables
                 "host": os.getenv("DATABASE_HOST", "127.0.0.1"),
-                "port": "5432",
-                "user": "postgres",
-                "password": "postgres",
-                "database": "fastapidb",
+                "port": os.getenv("DATABASE_PORT", "5432"),
+                "user": os.getenv("DATABASE_USER", "postgres"),
+                "password": os.getenv("DATABASE_PASSWORD", "postgres"),
+                "database": os.getenv("DATABASE_NAME", "fastapidb"),
+                **DATABASE_POOL,
             },
         }
     },
@@ -25,6 +42,48 @@ TORTOISE_ORM = {
     },
 }
 
+# "cached" count strategy: seconds before counting rows again
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 60))
+
+# user read endpoints response cache (ttl in seconds, 0 disables it)
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", 1024))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 30))
+
+# largest limit accepted by the filter endpoint pages
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 100))
+
+# create pg_trgm indexes for the filter endpoint at startup (PostgreSQL only)
+SEARCH_INDEXES = os.getenv("SEARCH_INDEXES", "true").lower() in ("1", "true", "yes")
+
+# POST /users/bulk: max users per request, rows per INSERT statement
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 10000))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 1000))
+
+# rows fetched per query by the streaming export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+
+# default data loader (/data): rows per bulk_create batch, batches inserted at once
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", 1000))
+LOAD_CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", 4))
+
+# POST /users write coalescing (opt-in): concurrent creates are gathered for
+# COALESCE_WINDOW seconds, or until COALESCE_MAX_ROWS rows, into one INSERT
+WRITE_COALESCING = os.getenv("WRITE_COALESCING", "false").lower() in ("1", "true", "yes")
+COALESCE_MAX_ROWS = int(os.getenv("COALESCE_MAX_ROWS", 100))
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", 0.005))
+
+# POST /users Idempotency-Key store: max keys, seconds before a key expires
+IDEMPOTENCY_MAXSIZE = int(os.getenv("IDEMPOTENCY_MAXSIZE", 10000))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", 86400))
+
+# email validation: cached results, deliverability (DNS) checks run in a thread
+# pool of EMAIL_DNS_WORKERS threads, skipped (syntax only) if EMAIL_OFFLINE,
+# their results expire after EMAIL_DNS_CACHE_TTL seconds (0: not cached)
+EMAIL_OFFLINE = os.getenv("EMAIL_OFFLINE", "false").lower() in ("1", "true", "yes")
+EMAIL_CACHE_MAXSIZE = int(os.getenv("EMAIL_CACHE_MAXSIZE", 4096))
+EMAIL_DNS_CACHE_TTL = float(os.getenv("EMAIL_DNS_CACHE_TTL", 3600))
+EMAIL_DNS_WORKERS = int(os.getenv("EMAIL_DNS_WORKERS", 8))
+
 CORS_MIDDLEWARE_CONFIG = {
     "allow_origins": ["*"],
     "allow_credentials": True,
@@ -0,0 +1,130 @@
+import time
+from functools import wraps
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from fastapi import Request
+
+from api.api_v1.settings import RESPONSE_CACHE_MAXSIZE, RESPONSE_CACHE_TTL
+
+
+class TTLCache:
+    """Bounded in-memory cache, entries expire `ttl` seconds after being set
+    and the least recently used entry is evicted when `maxsize` is reached
+    """
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        # incremented by clear: values computed before a clear can be dropped
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return cached value\n
+
+        Args:
+            key (Hashable): cache key
+            default (Any, optional): value if key is missing or expired. \
+                Defaults to None.
+
+        Returns:
+            Any: cached value or default
+        """
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Cache value for ttl seconds\n
+
+        Args:
+            key (Hashable): cache key
+            value (Any): value to cache
+        """
+        if self.maxsize < 1 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove key from cache\n
+
+        Args:
+            key (Hashable): cache key
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all cached values"""
+        self._data.clear()
+        self.generation += 1
+
+
+def request_key(request: Request) -> tuple:
+    """Build a cache key from the normalized request path and query\n
+
+    Args:
+        request (Request): current request
+
+    Returns:
+        tuple: path without trailing slash and sorted query parameters
+    """
+    path = request.url.path.rstrip("/") or "/"
+    return (path, tuple(sorted(request.query_params.multi_items())))
+
+
+def cached_response(cache: TTLCache) -> Callable:
+    """Cache endpoint responses (status code, headers and content)
+       by request path and query\n
+
+    The endpoint must take `request: Request` and `res: Response` parameters
+    and be decorated before being registered:
+
+        @router.get("/")
+        @cached_response(response_cache)
+        async def endpoint(request: Request, res: Response): ...
+
+    Args:
+        cache (TTLCache): where responses are stored
+
+    Returns:
+        Callable: endpoint decorator
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Any:
+            request, res = kwargs["request"], kwargs["res"]
+            key = request_key(request)
+            hit = cache.get(key)
+            if hit is not None:
+                status_code, headers, content = hit
+                res.status_code = status_code
+                res.headers.update(headers)
+                return content
+            generation = cache.generation
+            content = await endpoint(*args, **kwargs)
+            # a write cleared the cache meanwhile: content may be stale
+            if cache.generation == generation:
+                cache.set(key, (res.status_code, dict(res.headers.items()), content))
+            return content
+
+        return wrapper
+
+    return decorator
+
+
+# user read endpoints, cleared by every user write
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
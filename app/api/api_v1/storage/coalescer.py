@@ -0,0 +1,147 @@
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple, Type, Union
+
+from tortoise.models import Model
+
+from api.api_v1.models.tortoise import Person
+from api.api_v1.storage.database import Database
+from api.api_v1.settings import COALESCE_MAX_ROWS, COALESCE_WINDOW
+
+
+class WriteCoalescer:
+    """Gather concurrent inserts of a model for `window` seconds (or until
+    `max_rows` rows are waiting) and write them with one multi-row
+    INSERT ... RETURNING, each caller gets the ID of its own row
+    """
+
+    def __init__(self, model: Type[Model], max_rows: int = 100, window: float = 0.005):
+        self.model = model
+        self.max_rows = max_rows
+        self.window = window
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # running flushes, referenced until done
+        self._flushes: Set[asyncio.Task] = set()
+        self.reset_stats()
+
+    async def insert(self, row: Dict[str, Any]) -> int:
+        """Queue row for the next flush and wait for it to be written\n
+
+        Args:
+            row (Dict[str, Any]): attribute values
+
+        Raises:
+            Exception: error raised by the row INSERT (ex: IntegrityError)
+
+        Returns:
+            int: ID of the inserted row
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, time.perf_counter()))
+        if len(self._pending) >= self.max_rows:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Write the queued rows now (in a background task)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(
+        self, batch: List[Tuple[Dict[str, Any], asyncio.Future, float]]
+    ) -> None:
+        """Insert a batch and resolve its callers
+            called by flush function\n
+
+        A failing batch is written again one row at a time, so only the
+        callers of failing rows get an error.
+
+        Args:
+            batch (List[Tuple[Dict[str, Any], asyncio.Future, float]]): \
+                rows, their callers futures and queueing times
+        """
+        rows = [row for row, _, _ in batch]
+        start = time.perf_counter()
+        try:
+            results: List[Union[int, Exception]] = await Database.insert_many(
+                self.model, rows, self.max_rows
+            )
+        except Exception:
+            results = [await self._insert_one(row) for row in rows]
+        end = time.perf_counter()
+
+        for (_, future, queued_at), result in zip(batch, results):
+            self._wait_total += end - queued_at
+            self._wait_max = max(self._wait_max, end - queued_at)
+            if future.done():
+                # caller cancelled, the row is written anyway
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        self._flush_count += 1
+        self._row_count += len(batch)
+        self._size_max = max(self._size_max, len(batch))
+        self._flush_total += end - start
+        self._flush_max = max(self._flush_max, end - start)
+
+    async def _insert_one(self, row: Dict[str, Any]) -> Union[int, Exception]:
+        """Insert a single row
+            called by _write function\n
+
+        Args:
+            row (Dict[str, Any]): attribute values
+
+        Returns:
+            Union[int, Exception]: ID of the row or the error raised
+        """
+        try:
+            [pk] = await Database.insert_many(self.model, [row], 1)
+            return pk
+        except Exception as e:
+            return e
+
+    def stats(self) -> Dict[str, float]:
+        """Flush size and latency metrics, to tune max_rows and window\n
+
+        Returns:
+            Dict[str, float]: flushes and rows written, mean and max rows \
+                per flush, INSERT duration and caller wait (queued to \
+                resolved) in milliseconds
+        """
+        flushes, rows = self._flush_count, self._row_count
+        return {
+            "max_rows": self.max_rows,
+            "window_ms": self.window * 1e3,
+            "flushes": flushes,
+            "rows": rows,
+            "mean_flush_size": rows / flushes if flushes else 0.0,
+            "max_flush_size": self._size_max,
+            "mean_flush_ms": self._flush_total * 1e3 / flushes if flushes else 0.0,
+            "max_flush_ms": self._flush_max * 1e3,
+            "mean_wait_ms": self._wait_total * 1e3 / rows if rows else 0.0,
+            "max_wait_ms": self._wait_max * 1e3,
+        }
+
+    def reset_stats(self) -> None:
+        """Reset flush size and latency metrics"""
+        self._flush_count = self._row_count = self._size_max = 0
+        self._flush_total = self._flush_max = 0.0
+        self._wait_total = self._wait_max = 0.0
+
+
+# POST /users inserts when WRITE_COALESCING is enabled
+create_coalescer = WriteCoalescer(
+    Person, max_rows=COALESCE_MAX_ROWS, window=COALESCE_WINDOW
+)
@@ -1,13 +1,74 @@
-import re
-from typing import Any, List
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Type
+
+from tortoise.fields import BooleanField
+from tortoise.backends.base.executor import BaseExecutor
+from tortoise.models import Model
+from tortoise.queryset import QuerySet
 
 from tortoise.contrib.fastapi import register_tortoise
 from tortoise.query_utils import Q
+from tortoise.transactions import in_transaction
+
+from api.api_v1.models.tortoise import Person
+from api.api_v1.storage.cache import TTLCache
+from api.api_v1.storage.filters import (
+    parse as parse_filter,
+    LIST_OPERATORS,
+    TEXT_OPERATORS,
+)
+from api.api_v1.settings import (
+    TORTOISE_ORM as DATABASE_CONFIG,
+    COUNT_CACHE_TTL,
+    SEARCH_INDEXES,
+)
 
-from api.api_v1.settings import TORTOISE_ORM as DATABASE_CONFIG
+COUNT_STRATEGIES = ("exact", "cached", "estimated")
+# filter operators (see filters.OPERATORS) to tortoise lookups
+FILTER_LOOKUPS = {
+    "contains": "__icontains",
+    "eq": "",
+    "startswith": "__istartswith",
+    "in": "__in",
+    "gt": "__gt",
+    "gte": "__gte",
+    "lt": "__lt",
+    "lte": "__lte",
+    "range": "__range",
+}
+BOOLEAN_VALUES = {
+    "true": True,
+    "1": True,
+    "yes": True,
+    "false": False,
+    "0": False,
+    "no": False,
+}
+# attributes with an (attribute, id) index: sorted pages (ORDER BY attribute, id),
+# keyset pagination and exact filters
+SORT_FIELDS = (
+    "first_name",
+    "last_name",
+    "email",
+    "avatar",
+    "company",
+    "job",
+    "is_admin",
+    "gender",
+    "date_of_birth",
+    "country_of_birth",
+)
+# attributes stored lowercased (see the User validators), compared lowercased
+LOWERCASE_FIELDS = ("email",)
+# text attributes with a trigram index, searched by the filter endpoint
+SEARCH_FIELDS = ("first_name", "last_name", "email", "job", "company", "country_of_birth")
 
 
 class Database:
+    _counts = TTLCache(maxsize=32, ttl=COUNT_CACHE_TTL)
+    # startup index build running in the background (PostgreSQL)
+    _index_build: Optional[asyncio.Task] = None
+
     @classmethod
     def connect(cls, application=None):
         success = True
@@ -18,6 +79,16 @@ class Database:
                 generate_schemas=True,
                 add_exception_handlers=True,
             )
+
+            # runs after register_tortoise's handler: tables exist
+            @application.on_event("startup")
+            async def create_indexes() -> None:
+                if cls.is_postgres(Person):
+                    # CONCURRENTLY builds don't block writes, the app serves meanwhile
+                    cls._index_build = asyncio.ensure_future(cls.build_indexes(Person))
+                else:
+                    await cls.build_indexes(Person)
+
         except Exception as e:
             print(e)
             success = False
@@ -25,26 +96,682 @@ class Database:
         return success
 
     @classmethod
-    def query_filter_builder(cls, user_attribute: str, value: Any) -> List[Q]:
+    async def build_indexes(cls, model: Type[Model]) -> None:
+        """Create the indexes of indexes_sql, and the trigram indexes \
+            if SEARCH_INDEXES\n
+
+        Args:
+            model (Type[Model]): tortoise model
+        """
+        await cls.create_indexes(model)
+        if SEARCH_INDEXES:
+            await cls.create_search_indexes(model)
+
+    @classmethod
+    def query_filter_builder(
+        cls, user_attribute: str, value: Any, model: Type[Model] = Person
+    ) -> List[Q]:
         """Build a filter with Q function and attributes separated
            by following keywords: Or, And, AND, OR\n
 
         Args:
-            user_attribute (str): attributes
-            ex: first_nameOrlast_nameAndemail\n
-            value (Any): value that equals attribute\n
+            user_attribute (str): attributes, each one optionally followed \
+            by :operator (see filters.OPERATORS)
+            ex: first_nameOrlast_nameAndemail, date_of_birth:gte\n
+            value (Any): value compared with attributes, comma separated \
+            values for in and range operators\n
+            model (Type[Model], optional): filtered model. Defaults to Person.\n
+
+        Raises:
+            ValueError: if value doesn't match an attribute type \
+            (ex: date_of_birth:gte/notadate)
 
         Returns:
             List[Q]: List of Q functions according to attributes and value\n
+
+        Except contains, operators compare the column itself (=, IN, <, >,
+        BETWEEN) so B-tree indexes apply. On PostgreSQL, contains and
+        startswith conditions on SEARCH_FIELDS use the trigram indexes made
+        by create_search_indexes.
         """
-        attributes = re.compile(r"Or|And|OR|AND").split(user_attribute)
         query_builder = []
-        for attr in attributes:
-            attr = attr.strip().lower()
-            cond = {f"{attr}__icontains": value}
-            if user_attribute.split(attr)[0].lower().endswith("or"):
-                last_query = query_builder.pop()
-                query_builder.append(Q(last_query, Q(**cond), join_type="OR"))
-            elif attr != "":
-                query_builder = [*query_builder, Q(**cond)]
+        for group in parse_filter(user_attribute).groups:
+            conditions = [
+                Q(
+                    **{
+                        f"{cond.attribute}{FILTER_LOOKUPS[cond.operator]}": (
+                            cls.filter_value(model, cond.attribute, cond.operator, value)
+                        )
+                    }
+                )
+                for cond in group.conditions
+            ]
+            if len(conditions) == 1:
+                query_builder.append(conditions[0])
+            else:
+                query_builder.append(Q(*conditions, join_type=Q.OR))
         return query_builder
+
+    @classmethod
+    def filter_value(
+        cls, model: Type[Model], attribute: str, operator: str, value: str
+    ) -> Any:
+        """Convert a filter value to the attribute type,
+           so it's compared with the column and not its text\n
+
+        contains and startswith compare the column text: their value is kept.
+
+        Args:
+            model (Type[Model]): tortoise model
+            attribute (str): filtered attribute
+            operator (str): filter operator (see filters.OPERATORS)
+            value (str): value from the request
+
+        Raises:
+            ValueError: if value doesn't match the attribute type
+
+        Returns:
+            Any: converted value, list for in and range operators
+        """
+        if operator in TEXT_OPERATORS:
+            return value
+        field = model._meta.fields_map[attribute]
+        values = value.split(",") if operator in LIST_OPERATORS else [value]
+        if isinstance(field, BooleanField):
+            values = [v.strip().lower() for v in values]
+            if not set(values) <= BOOLEAN_VALUES.keys():
+                raise ValueError(f"{attribute} takes one of {tuple(BOOLEAN_VALUES)}")
+            converted = [BOOLEAN_VALUES[v] for v in values]
+        else:
+            converted = [field.to_python_value(v) for v in values]
+        if attribute in LOWERCASE_FIELDS:
+            converted = [v.lower() for v in converted]
+        if operator == "range" and len(converted) != 2:
+            raise ValueError("range takes two comma separated values")
+        return converted if operator in LIST_OPERATORS else converted[0]
+
+    @classmethod
+    def chunks(cls, items: List[Any], size: int) -> Iterator[List[Any]]:
+        """Split items in consecutive lists of at most size items\n
+
+        Args:
+            items (List[Any]): items to split
+            size (int): max items per list
+
+        Yields:
+            Iterator[List[Any]]: items[0:size], items[size:2 * size], ...
+        """
+        for start in range(0, len(items), size):
+            end = start + size
+            yield items[start:end]
+
+    @classmethod
+    def _values_sql(
+        cls,
+        executor: BaseExecutor,
+        model: Type[Model],
+        rows: List[Dict[str, Any]],
+        names: List[str],
+    ) -> Tuple[str, List[Any]]:
+        """Build a VALUES list of rows with dialect placeholders
+           called by insert_many and update_many functions\n
+
+        Args:
+            executor (BaseExecutor): executor of the connection
+            model (Type[Model]): tortoise model
+            rows (List[Dict[str, Any]]): attribute values of each row
+            names (List[str]): attributes of each VALUES row, \
+                the primary key is cast to integer
+
+        Returns:
+            Tuple[str, List[Any]]: "(?, ?), (?, ?)" and values converted \
+                to the database types
+        """
+        pk = model._meta.pk_attr
+        values: List[Any] = []
+        groups = []
+        for row in rows:
+            params = []
+            for name in names:
+                param = executor.parameter(len(values)).get_sql()
+                params.append(f"CAST({param} AS INTEGER)" if name == pk else param)
+                values.append(executor.column_map[name](row.get(name), model))
+            groups.append(f"({', '.join(params)})")
+        return ", ".join(groups), values
+
+    @classmethod
+    async def insert_many(
+        cls,
+        model: Type[Model],
+        rows: List[Dict[str, Any]],
+        chunk_size: int,
+        on_conflict: str = "",
+    ) -> List[int]:
+        """Insert rows with one multi-row INSERT ... RETURNING statement per chunk,
+           all chunks in a single transaction\n
+
+        RETURNING rows come in no documented order (PostgreSQL, SQLite):
+        each ID is matched to its row by the returned email, emails of a
+        statement must differ (they are unique regardless of case).
+
+        Args:
+            model (Type[Model]): tortoise model
+            rows (List[Dict[str, Any]]): attribute values of each row
+            chunk_size (int): max rows per statement
+            on_conflict (str, optional): ON CONFLICT clause. Defaults to "".
+
+        Raises:
+            ValueError: if rows of a statement have the same email
+
+        Returns:
+            List[int]: IDs of the inserted (or updated on conflict) rows, in rows order
+        """
+        table, pk = model._meta.db_table, model._meta.db_pk_column
+        email = model._meta.fields_db_projection["email"]
+        chunks = list(cls.chunks(rows, chunk_size))
+        for chunk in chunks:
+            emails = {row.get("email") for row in chunk}
+            if len(emails) != len(chunk):
+                raise ValueError("rows of a statement must have different emails")
+        ids: List[int] = []
+        async with in_transaction(model._meta.db.connection_name) as conn:
+            executor = conn.executor_class(model=model, db=conn)
+            names = executor.regular_columns
+            columns = ", ".join(
+                f'"{model._meta.fields_db_projection[name]}"' for name in names
+            )
+            for chunk in chunks:
+                rows_sql, values = cls._values_sql(executor, model, chunk, names)
+                _, inserted = await conn.execute_query(
+                    f'INSERT INTO "{table}" ({columns}) VALUES {rows_sql}'
+                    f'{on_conflict and " " + on_conflict} RETURNING "{pk}", "{email}"',
+                    values,
+                )
+                # the stored email is the one sent (EXCLUDED one on conflict)
+                ids_by_email = {row[email]: row[pk] for row in inserted}
+                ids.extend(ids_by_email[row.get("email")] for row in chunk)
+        return ids
+
+    @classmethod
+    async def upsert_many(
+        cls, model: Type[Model], rows: List[Dict[str, Any]], chunk_size: int
+    ) -> List[int]:
+        """Insert rows or update the stored rows with the same email (case
+           insensitive), with one INSERT ... ON CONFLICT (LOWER("email"))
+           DO UPDATE ... RETURNING statement per chunk, all chunks in a
+           single transaction\n
+
+        The conflict target is the unique index of indexes_sql, rows must
+        have different emails (a statement can't update a row twice).
+
+        Args:
+            model (Type[Model]): tortoise model
+            rows (List[Dict[str, Any]]): attribute values of each row
+            chunk_size (int): max rows per statement
+
+        Returns:
+            List[int]: IDs of the inserted or updated rows, in rows order
+        """
+        executor = model._meta.db.executor_class(model=model, db=model._meta.db)
+        columns = [
+            model._meta.fields_db_projection[name] for name in executor.regular_columns
+        ]
+        assignments = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns)
+        return await cls.insert_many(
+            model,
+            rows,
+            chunk_size,
+            on_conflict=f'ON CONFLICT (LOWER("email")) DO UPDATE SET {assignments}',
+        )
+
+    @classmethod
+    async def update_returning(
+        cls, model: Type[Model], pk_value: int, values: Dict[str, Any]
+    ) -> Optional[Model]:
+        """Update one row with a single UPDATE ... WHERE pk RETURNING * statement,
+           no SELECT before the write\n
+
+        Args:
+            model (Type[Model]): tortoise model
+            pk_value (int): primary key of the row
+            values (Dict[str, Any]): attributes to write, the others are unchanged
+
+        Returns:
+            Optional[Model]: updated row, None if it doesn't exist
+        """
+        table, pk = model._meta.db_table, model._meta.db_pk_column
+        conn = model._meta.db
+        executor = conn.executor_class(model=model, db=conn)
+        assignments, params = [], []
+        for name, value in values.items():
+            param = executor.parameter(len(params)).get_sql()
+            assignments.append(f'"{model._meta.fields_db_projection[name]}" = {param}')
+            params.append(executor.column_map[name](value, model))
+        # nothing to write: the statement still returns the row
+        assignments = assignments or [f'"{pk}" = "{pk}"']
+        param = executor.parameter(len(params)).get_sql()
+        _, rows = await conn.execute_query(
+            f'UPDATE "{table}" SET {", ".join(assignments)} '
+            f'WHERE "{pk}" = {param} RETURNING *',
+            [*params, pk_value],
+        )
+        return model._init_from_db(**rows[0]) if rows else None
+
+    @classmethod
+    async def update_many(
+        cls,
+        model: Type[Model],
+        rows: List[Dict[str, Any]],
+        fields: Tuple[str, ...],
+        chunk_size: int,
+    ) -> List[int]:
+        """Update rows, each one with its own values, with one
+           UPDATE ... FROM (VALUES ...) RETURNING statement per chunk
+           of rows sending the same attributes, all in a single transaction\n
+
+        Args:
+            model (Type[Model]): tortoise model
+            rows (List[Dict[str, Any]]): primary key and values of each row, \
+                the attributes missing from a row are left unchanged
+            fields (Tuple[str, ...]): attributes that can be updated
+            chunk_size (int): max rows per statement
+
+        Returns:
+            List[int]: IDs of the updated rows (missing IDs are skipped)
+        """
+        table, pk = model._meta.db_table, model._meta.db_pk_column
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            sent = tuple(name for name in fields if name in row)
+            groups.setdefault(sent, []).append(row)
+        ids: List[int] = []
+        async with in_transaction(model._meta.db.connection_name) as conn:
+            executor = conn.executor_class(model=model, db=conn)
+            for sent, group in groups.items():
+                columns = [model._meta.fields_db_projection[name] for name in sent]
+                names = "".join(f', "{column}"' for column in columns)
+                assignments = [f'"{column}" = "_values"."{column}"' for column in columns]
+                # no attribute sent: the row is only matched
+                assignments = assignments or [f'"{pk}" = "_values"."_id"']
+                for chunk in cls.chunks(group, chunk_size):
+                    rows_sql, values = cls._values_sql(
+                        executor, model, chunk, [pk, *sent]
+                    )
+                    _, updated = await conn.execute_query(
+                        f'WITH "_values" ("_id"{names}) AS (VALUES {rows_sql}) '
+                        f'UPDATE "{table}" SET {", ".join(assignments)} FROM "_values" '
+                        f'WHERE "{table}"."{pk}" = "_values"."_id" '
+                        f'RETURNING "{table}"."{pk}"',
+                        values,
+                    )
+                    ids.extend(row[pk] for row in updated)
+        return ids
+
+    @classmethod
+    async def delete_returning(
+        cls, model: Type[Model], pk_value: int
+    ) -> Optional[Dict[str, Any]]:
+        """Delete one row with a single DELETE ... WHERE pk RETURNING * statement,
+           no SELECT before the write\n
+
+        Args:
+            model (Type[Model]): tortoise model
+            pk_value (int): primary key of the row
+
+        Returns:
+            Optional[Dict[str, Any]]: deleted row attributes (python values, \
+                no model instance), None if it doesn't exist
+        """
+        table, pk = model._meta.db_table, model._meta.db_pk_column
+        conn = model._meta.db
+        param = conn.executor_class(model=model, db=conn).parameter(0).get_sql()
+        _, rows = await conn.execute_query(
+            f'DELETE FROM "{table}" WHERE "{pk}" = {param} RETURNING *', [pk_value]
+        )
+        if not rows:
+            return None
+        fields = model._meta.fields_map
+        attributes = model._meta.fields_db_projection_reverse
+        return {
+            attributes[column]: fields[attributes[column]].to_python_value(value)
+            for column, value in dict(rows[0]).items()
+        }
+
+    @classmethod
+    async def delete_many(
+        cls, model: Type[Model], ids: List[int], chunk_size: int
+    ) -> List[int]:
+        """Delete rows with one DELETE ... WHERE id IN (...) RETURNING statement
+           per chunk, all chunks in a single transaction\n
+
+        Args:
+            model (Type[Model]): tortoise model
+            ids (List[int]): IDs of the rows to delete
+            chunk_size (int): max IDs per statement
+
+        Returns:
+            List[int]: IDs of the deleted rows (missing IDs are skipped)
+        """
+        table, pk = model._meta.db_table, model._meta.db_pk_column
+        deleted: List[int] = []
+        async with in_transaction(model._meta.db.connection_name) as conn:
+            executor = conn.executor_class(model=model, db=conn)
+            for chunk in cls.chunks(ids, chunk_size):
+                params = ", ".join(
+                    executor.parameter(n).get_sql() for n in range(len(chunk))
+                )
+                _, rows = await conn.execute_query(
+                    f'DELETE FROM "{table}" WHERE "{pk}" IN ({params}) RETURNING "{pk}"',
+                    chunk,
+                )
+                deleted.extend(row[pk] for row in rows)
+        return deleted
+
+    @classmethod
+    def is_postgres(cls, model: Type[Model]) -> bool:
+        """Check if the model is stored in a PostgreSQL database\n
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            bool: True for PostgreSQL
+        """
+        return model._meta.db.capabilities.dialect == "postgres"
+
+    @classmethod
+    def nulls_are_largest(cls, model: Type[Model]) -> bool:
+        """Check if the model's database sorts NULL values after any other value\n
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            bool: True for PostgreSQL, False for SQLite and MySQL
+        """
+        return cls.is_postgres(model)
+
+    @classmethod
+    def pool_stats(cls, model: Type[Model]) -> Dict[str, Any]:
+        """Live connection pool metrics of the model's database, \
+            to tune the DATABASE_POOL settings\n
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            Dict[str, Any]: pool min and max sizes, open connections, \
+                connections in use and idle, acquires waiting for a connection. \
+                pooled is False if connections aren't pooled (ex: SQLite)
+        """
+        pool = getattr(model._meta.db, "_pool", None)
+        if pool is None:
+            return {
+                "pooled": False,
+                "min_size": None,
+                "max_size": None,
+                "size": 0,
+                "in_use": 0,
+                "idle": 0,
+                "waiters": 0,
+            }
+        # asyncpg.Pool has no public counters before 0.25
+        opened = [holder for holder in pool._holders if holder._con is not None]
+        in_use = sum(holder._in_use is not None for holder in opened)
+        getters = pool._queue._getters if pool._queue is not None else ()
+        return {
+            "pooled": True,
+            "min_size": pool._minsize,
+            "max_size": pool._maxsize,
+            "size": len(opened),
+            "in_use": in_use,
+            "idle": len(opened) - in_use,
+            "waiters": sum(not getter.done() for getter in getters),
+        }
+
+    @classmethod
+    def indexes_sql(cls, model: Type[Model]) -> List[str]:
+        """Build the statements creating the person indexes: unique \
+           lowercased email, admins partial index and one (attribute, id) \
+           index per SORT_FIELDS attribute\n
+
+        They aren't declared in Meta.indexes: generate_schemas would build
+        them at every startup, in one transaction that blocks writes. On
+        PostgreSQL they are built CONCURRENTLY (writes aren't blocked while
+        the table is read), each statement must run outside a transaction.
+        An interrupted build leaves an INVALID index that IF NOT EXISTS
+        keeps, drop it to build it again.
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            List[str]: idempotent SQL statements (PostgreSQL and SQLite)
+        """
+        table = model._meta.db_table
+        concurrently = "CONCURRENTLY " if cls.is_postgres(model) else ""
+        return [
+            f'CREATE UNIQUE INDEX {concurrently}IF NOT EXISTS "uid_{table}_email_lower" '
+            f'ON "{table}" (LOWER("email"))',
+            f'CREATE INDEX {concurrently}IF NOT EXISTS "idx_{table}_admins" '
+            f'ON "{table}" ("id") WHERE "is_admin" = TRUE',
+        ] + [
+            f'CREATE INDEX {concurrently}IF NOT EXISTS "idx_{table}_{attr}_id" '
+            f'ON "{table}" ("{attr}", "id")'
+            for attr in SORT_FIELDS
+        ]
+
+    @classmethod
+    async def create_indexes(cls, model: Type[Model]) -> bool:
+        """Create the indexes of indexes_sql if missing, \
+            one statement per call (outside a transaction)\n
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            bool: True if the indexes exist, False if they can't be made \
+                (ex: emails differing only by case are already stored)
+        """
+        try:
+            for sql in cls.indexes_sql(model):
+                await model._meta.db.execute_script(sql)
+        except Exception as e:
+            print(e)
+            return False
+        return True
+
+    @classmethod
+    def search_indexes_sql(cls, model: Type[Model]) -> List[str]:
+        """Build the statements creating a pg_trgm GIN index per SEARCH_FIELDS
+           attribute, on the expression __icontains filters compare:
+           UPPER(CAST(attribute AS VARCHAR)) LIKE UPPER('%value%')\n
+
+        Indexes are built CONCURRENTLY (writes aren't blocked), each statement
+        must run outside a transaction.
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            List[str]: idempotent SQL statements
+        """
+        table = model._meta.db_table
+        return ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_{table}_{attr}_trgm" '
+            f'ON "{table}" USING GIN (UPPER(CAST("{attr}" AS VARCHAR)) gin_trgm_ops)'
+            for attr in SEARCH_FIELDS
+        ]
+
+    @classmethod
+    async def create_search_indexes(cls, model: Type[Model]) -> bool:
+        """Create the filter endpoint trigram indexes if missing\n
+
+        Args:
+            model (Type[Model]): tortoise model
+
+        Returns:
+            bool: True if the indexes exist, False if the database isn't \
+                PostgreSQL or pg_trgm can't be installed (filters scan the table)
+        """
+        if not cls.is_postgres(model):
+            return False
+        try:
+            for sql in cls.search_indexes_sql(model):
+                await model._meta.db.execute_script(sql)
+        except Exception as e:
+            print(e)
+            return False
+        return True
+
+    @classmethod
+    async def count(cls, model: Type[Model], strategy: str = "exact") -> int:
+        """Count model rows\n
+
+        Args:
+            model (Type[Model]): tortoise model
+            strategy (str, optional): one of COUNT_STRATEGIES. \
+                exact: COUNT(*), \
+                cached: COUNT(*) reused for COUNT_CACHE_TTL seconds, \
+                estimated: planner statistics (PostgreSQL only, \
+                exact elsewhere or if the table was never analyzed: \
+                estimate of -1 since PostgreSQL 14, 0 before). \
+                Defaults to "exact".
+
+        Returns:
+            int: number of rows
+        """
+        if strategy == "cached":
+            total = cls._counts.get(model.__name__)
+            if total is None:
+                total = await model.all().count()
+                cls._counts.set(model.__name__, total)
+            return total
+        if strategy == "estimated" and cls.is_postgres(model):
+            rows = await model._meta.db.execute_query_dict(
+                "SELECT reltuples::bigint AS estimate FROM pg_class "
+                "WHERE oid = to_regclass($1)",
+                [model._meta.db_table],
+            )
+            # an empty table is counted exactly too, COUNT(*) is cheap then
+            if rows and rows[0]["estimate"] > 0:
+                return rows[0]["estimate"]
+        return await model.all().count()
+
+    @classmethod
+    def invalidate_count(cls, model: Type[Model]) -> None:
+        """Forget the cached number of model rows after an insert or a delete\n
+
+        Args:
+            model (Type[Model]): tortoise model
+        """
+        cls._counts.delete(model.__name__)
+
+    @classmethod
+    def keyset_filter(
+        cls,
+        attr: str,
+        value: Any,
+        last_id: int,
+        ascending: bool = True,
+        nulls_last: bool = False,
+    ) -> Q:
+        """Build the condition selecting rows placed after (attr, id) = (value, last_id)
+           in an ORDER BY attr, id query\n
+
+        Args:
+            attr (str): sort attribute
+            value (Any): sort attribute value of the last seen row
+            last_id (int): ID of the last seen row
+            ascending (bool): sort direction
+            nulls_last (bool): NULL values are placed at the end of the result\n
+
+        Returns:
+            Q: keyset condition
+        """
+        op = "gt" if ascending else "lt"
+        if attr == "id":
+            return Q(**{f"id__{op}": last_id})
+        same_value = {f"{attr}__isnull": True} if value is None else {attr: value}
+        tie = Q(**same_value, **{f"id__{op}": last_id})
+        if value is None:
+            if nulls_last:
+                return tie
+            return Q(tie, Q(**{f"{attr}__not_isnull": True}), join_type=Q.OR)
+        after = [Q(**{f"{attr}__{op}": value}), tie]
+        if nulls_last:
+            after.append(Q(**{f"{attr}__isnull": True}))
+        return Q(*after, join_type=Q.OR)
+
+    @classmethod
+    def keyset_paginate(
+        cls,
+        queryset: QuerySet,
+        order_by: str,
+        limit: int,
+        position: Optional[Dict[str, Any]] = None,
+    ) -> QuerySet:
+        """Seek the page following (or preceding) a cursor position instead of
+           skipping rows with OFFSET, so every page costs the same\n
+
+        Args:
+            queryset (QuerySet): rows to paginate
+            order_by (str): valid order (see API_functools.valid_order)
+            limit (int): max number of rows
+            position (Optional[Dict[str, Any]]): decoded cursor, \
+                None for the first page\n
+
+        Raises:
+            ValueError: if the cursor value doesn't match the sort attribute type
+
+        Returns:
+            QuerySet: rows of the page, in reverse order for a backwards cursor
+        """
+        backwards = position is not None and position["backwards"]
+        descending = order_by.startswith("-") != backwards
+        attr = order_by.lstrip("-")
+        direction = "-" if descending else ""
+        ordering = [f"{direction}{attr}"] + ([f"{direction}id"] if attr != "id" else [])
+        if position is not None:
+            field = queryset.model._meta.fields_map[attr]
+            value = field.to_python_value(position["value"])
+            nulls_last = cls.nulls_are_largest(queryset.model) != descending
+            queryset = queryset.filter(
+                cls.keyset_filter(attr, value, position["id"], not descending, nulls_last)
+            )
+        return queryset.order_by(*ordering).limit(limit)
+
+    @classmethod
+    async def iterate_chunks(
+        cls,
+        queryset: QuerySet,
+        order_by: str,
+        fields: Tuple[str, ...],
+        chunk_size: int,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over all rows with one keyset paginated query per chunk,
+           so memory use doesn't depend on the number of rows\n
+
+        Args:
+            queryset (QuerySet): rows to iterate over
+            order_by (str): valid order (see API_functools.valid_order)
+            fields (Tuple[str, ...]): attributes to select, the ID included
+            chunk_size (int): number of rows fetched per query
+
+        Yields:
+            Dict[str, Any]: row values
+        """
+        attr = order_by.lstrip("-")
+        extra = () if attr in fields else (attr,)
+        position = None
+        while True:
+            page = cls.keyset_paginate(queryset, order_by, chunk_size, position)
+            rows = await page.values(*fields, *extra)
+            for row in rows:
+                key = {"value": row[attr], "id": row["id"]}
+                for name in extra:
+                    del row[name]
+                yield row
+            if len(rows) < chunk_size:
+                return
+            position = {"order_by": order_by, **key, "backwards": False}
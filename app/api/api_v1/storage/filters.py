@@ -0,0 +1,94 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+# attribute expression keywords, "Or" binds tighter than "And"
+KEYWORDS = re.compile(r"(Or|OR|And|AND)")
+OR_KEYWORDS = ("Or", "OR")
+# attribute:operator, contains if the operator is omitted
+OPERATORS = ("contains", "eq", "startswith", "in", "gt", "gte", "lt", "lte", "range")
+# operators taking comma separated values
+LIST_OPERATORS = ("in", "range")
+# operators comparing the column text, their value isn't converted
+TEXT_OPERATORS = ("contains", "startswith")
+
+
+class Condition(NamedTuple):
+    """attribute compared with the filter value"""
+
+    attribute: str
+    operator: str = "contains"
+
+
+class AnyOf(NamedTuple):
+    """at least one condition matches (attributes joined by Or)"""
+
+    conditions: Tuple[Condition, ...]
+
+
+class AllOf(NamedTuple):
+    """every group matches (groups joined by And)"""
+
+    groups: Tuple[AnyOf, ...]
+
+    def conditions(self) -> Tuple[Condition, ...]:
+        """Return all conditions\n
+
+        Returns:
+            Tuple[Condition, ...]: conditions, in expression order
+        """
+        return tuple(cond for group in self.groups for cond in group.conditions)
+
+    def attributes(self) -> Tuple[str, ...]:
+        """Return the attributes of all conditions\n
+
+        Returns:
+            Tuple[str, ...]: attributes, in expression order
+        """
+        return tuple(cond.attribute for cond in self.conditions())
+
+
+def tokenize(expression: str) -> Tuple[str, ...]:
+    """Split an attribute expression into attributes and keywords\n
+
+    Args:
+        expression (str): ex: first_nameOrlast_nameAndemail
+
+    Returns:
+        Tuple[str, ...]: ex: ("first_name", "Or", "last_name", "And", "email")
+    """
+    return tuple(
+        token if KEYWORDS.fullmatch(token) else token.strip().lower()
+        for token in KEYWORDS.split(expression)
+    )
+
+
+@lru_cache(maxsize=512)
+def parse(expression: str) -> AllOf:
+    """Build the AST of an attribute expression, plans of hot expressions
+       are cached so they are parsed once\n
+
+    Empty attributes (ex: trailing keyword) are ignored.
+
+    Args:
+        expression (str): attributes joined by Or, And (OR, AND), \
+        each one can be followed by :operator (see OPERATORS)
+        ex: first_nameOrlast_nameAndemail, email:eqOrdate_of_birth:gte\n
+
+    Returns:
+        AllOf: ex: AllOf(AnyOf(first_name, last_name), AnyOf(email))
+    """
+    tokens = tokenize(expression)
+    groups, conditions = [], []
+    # tokens alternate: attribute, keyword, attribute, ...
+    for index in range(0, len(tokens), 2):
+        if tokens[index]:
+            attribute, _, operator = tokens[index].partition(":")
+            conditions.append(
+                Condition(attribute.strip(), operator.strip() or "contains")
+            )
+        keyword = tokens[index + 1] if index + 1 < len(tokens) else None
+        if keyword not in OR_KEYWORDS and conditions:
+            groups.append(AnyOf(tuple(conditions)))
+            conditions = []
+    return AllOf(tuple(groups))
@@ -0,0 +1,72 @@
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator
+
+from api.api_v1.storage.initial_data import INIT_DATA
+
+# values are drawn from INIT_DATA: same names, jobs, companies, countries,
+# and the same gender and is_admin proportions
+
+
+def _valid(attribute: str) -> tuple:
+    """INIT_DATA values of attribute that User validation accepts (3 to 50 characters)"""
+    return tuple(
+        user[attribute] for user in INIT_DATA if 3 <= len(user[attribute].strip()) <= 50
+    )
+
+
+FIRST_NAMES = _valid("first_name")
+LAST_NAMES = _valid("last_name")
+JOBS = _valid("job")
+COMPANIES = _valid("company")
+COUNTRIES = _valid("country_of_birth")
+# email local part: first name initial and last name, ex: jdoe
+EMAIL_NAMES = {
+    (first_name, last_name): "".join(
+        filter(str.isalnum, first_name[0] + last_name)
+    ).lower()
+    for first_name in FIRST_NAMES
+    for last_name in LAST_NAMES
+}
+GENDERS = tuple(user["gender"] for user in INIT_DATA)
+ADMINS = tuple(user["is_admin"] for user in INIT_DATA)
+DOMAINS = tuple(user["email"].rpartition("@")[2] for user in INIT_DATA)
+# INIT_DATA birth dates are spread over 1970-1999
+BIRTH_START, BIRTH_DAYS = date(1970, 1, 1), (date(1999, 12, 31) - date(1970, 1, 1)).days
+AVATAR = "https://robohash.org/{}.png?size=150x150&set=set1"
+
+
+def generate_users(
+    quantity: int, seed: int = 0, start: int = 0
+) -> Iterator[Dict[str, Any]]:
+    """Stream synthetic users, valid according to User class\n
+
+    The same seed and start always give the same users.
+
+    Args:
+        quantity (int): number of users
+        seed (int, optional): random seed. Defaults to 0.
+        start (int, optional): number of the first user, emails end \
+            with the user number so they are unique. Defaults to 0.
+
+    Yields:
+        Dict[str, Any]: user data, same format as INIT_DATA
+    """
+    rng = random.Random(seed)
+    choice, randrange = rng.choice, rng.randrange
+    for number in range(start, start + quantity):
+        first_name, last_name = choice(FIRST_NAMES), choice(LAST_NAMES)
+        yield {
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": f"{EMAIL_NAMES[first_name, last_name]}{number}@{choice(DOMAINS)}",
+            "gender": choice(GENDERS),
+            "is_admin": choice(ADMINS),
+            "date_of_birth": (
+                BIRTH_START + timedelta(days=randrange(BIRTH_DAYS + 1))
+            ).isoformat(),
+            "country_of_birth": choice(COUNTRIES),
+            "avatar": AVATAR.format(f"{rng.getrandbits(64):016x}"),
+            "job": choice(JOBS),
+            "company": choice(COMPANIES),
+        }
@@ -0,0 +1,150 @@
+import hashlib
+from abc import ABC, abstractmethod
+from functools import wraps
+from typing import Any, Callable, Optional, Set, Tuple, Type
+
+from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from api.api_v1.responses import FastJSONResponse
+from api.api_v1.storage.cache import TTLCache
+from api.api_v1.settings import IDEMPOTENCY_MAXSIZE, IDEMPOTENCY_TTL
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+# (request body digest, status code, JSON content)
+Record = Tuple[str, int, Any]
+
+
+class IdempotencyStore(ABC):
+    """Responses of requests sent with an Idempotency-Key header.
+    Shared backends (ex: Redis) subclass it, implement get and set
+    (records are JSON serializable) and are installed with use_store
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Record]:
+        """Return the stored record of key, None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, record: Record) -> None:
+        """Store the record of key"""
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """In-process store, bounded and TTL'd (see TTLCache)"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Record]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, record: Record) -> None:
+        self.cache.set(key, record)
+
+
+store: IdempotencyStore = MemoryIdempotencyStore(
+    maxsize=IDEMPOTENCY_MAXSIZE, ttl=IDEMPOTENCY_TTL
+)
+# keys of requests being processed by this process
+_in_flight: Set[str] = set()
+
+
+def use_store(new_store: IdempotencyStore) -> None:
+    """Replace the idempotency store (ex: at startup)\n
+
+    Args:
+        new_store (IdempotencyStore): store used by idempotent endpoints
+    """
+    global store
+    store = new_store
+
+
+def _error(status_code: int, detail: str) -> FastJSONResponse:
+    """Error response of idempotent endpoints
+        called by idempotent function\n
+
+    Args:
+        status_code (int): status code
+        detail (str): error detail
+
+    Returns:
+        FastJSONResponse: response, not validated against the endpoint response_model
+    """
+    return FastJSONResponse({"success": False, "detail": detail}, status_code=status_code)
+
+
+def idempotent(
+    status_code: int = status.HTTP_200_OK,
+    response_model: Optional[Type[BaseModel]] = None,
+) -> Callable:
+    """Replay the stored response of a request already sent with the same
+       Idempotency-Key header, without calling the endpoint again\n
+
+    The endpoint must take `request: Request` and `res: Response` parameters.
+    Keys are scoped by method and path, a key sent again with another body
+    is rejected (422), and so is a key whose first request is still
+    running (409). Requests without the header aren't deduplicated.
+
+    Args:
+        status_code (int, optional): status code if the endpoint \
+            doesn't set one. Defaults to 200.
+        response_model (Optional[Type[BaseModel]], optional): response_model \
+            of the route, stored content is serialized through it so replays \
+            match the first response. Defaults to None.
+
+    Returns:
+        Callable: endpoint decorator
+    """
+
+    def decorator(endpoint: Callable) -> Callable:
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Any:
+            request, res = kwargs["request"], kwargs["res"]
+            header = request.headers.get(HEADER)
+            if header is None:
+                return await endpoint(*args, **kwargs)
+            key = f"{request.method} {request.url.path.rstrip('/')} {header}"
+            digest = hashlib.sha256(await request.body()).hexdigest()
+
+            record = await store.get(key)
+            if record is not None:
+                stored_digest, stored_status, content = record
+                if stored_digest != digest:
+                    return _error(
+                        status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        f"{HEADER} already used with another request body",
+                    )
+                response = FastJSONResponse(content, status_code=stored_status)
+                response.headers[REPLAYED_HEADER] = "true"
+                return response
+            if key in _in_flight:
+                return _error(
+                    status.HTTP_409_CONFLICT,
+                    f"A request with this {HEADER} is being processed",
+                )
+
+            _in_flight.add(key)
+            try:
+                content = await endpoint(*args, **kwargs)
+                # as FastAPI renders it: response_model fields, in their order
+                rendered = (
+                    content
+                    if response_model is None
+                    else response_model.parse_obj(content)
+                )
+                record = (
+                    digest,
+                    res.status_code or status_code,
+                    jsonable_encoder(rendered),
+                )
+                await store.set(key, record)
+            finally:
+                _in_flight.discard(key)
+            return content
+
+        return wrapper
+
+    return decorator
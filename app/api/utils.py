@@ -1,10 +1,23 @@
-import concurrent.futures as futures
+import json
+import time
+import base64
+import asyncio
+import binascii
+from itertools import islice
 
-from typing import Optional, Dict, Any, Type, TypeVar, List
+from enum import Enum
+from datetime import date
+from urllib.parse import urlencode
+from typing import Optional, Dict, Any, Type, TypeVar, List, Tuple, Iterable, Iterator
 from pydantic import BaseModel
+from starlette.datastructures import QueryParams
+from tortoise.exceptions import IntegrityError
 
 from api.api_v1.models.tortoise import Person
+from api.api_v1.storage.database import Database
+from api.api_v1.storage.cache import response_cache
 from api.api_v1.storage.initial_data import INIT_DATA
+from api.api_v1.settings import LOAD_BATCH_SIZE, LOAD_CONCURRENCY
 
 ORDERS: Dict[str, str] = {"asc": "", "desc": "-"}
 MODEL = TypeVar("MODEL", bound="API_functools")
@@ -90,61 +103,283 @@ class API_functools:
         """
         return attr.lower() in cls.get_attributes(target_cls)
 
+    @classmethod
+    def encode_cursor(
+        cls: Type[MODEL], order_by: str, row: Dict[str, Any], backwards: bool = False
+    ) -> str:
+        """Build an opaque pagination cursor from the last seen row\n
+
+        Args:\n
+            cls (API_functools): utility class that used to call this method\n
+            order_by (str): valid order (see valid_order)\n
+            row (Dict[str, Any]): last (or first if backwards) row \
+                of the current page\n
+            backwards (bool, optional): the cursor points to the previous page. \
+                Defaults to False.\n
+
+        Returns:\n
+            str: url-safe cursor
+        """
+        value = row[order_by.lstrip("-")]
+        if isinstance(value, Enum):
+            value = value.value
+        elif isinstance(value, date):
+            value = value.isoformat()
+        payload = json.dumps(
+            [order_by, value, row["id"], backwards], separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode_cursor(
+        cls: Type[MODEL], target_cls: BaseModel, cursor: str
+    ) -> Optional[Dict[str, Any]]:
+        """Read a cursor built by encode_cursor\n
+
+        Args:\n
+            cls (API_functools): utility class that used to call this method\n
+            target_cls (BaseModel): model for db data\n
+            cursor (str): cursor from http request\n
+
+        Returns:\n
+            Optional[Dict[str, Any]]: cursor position(order_by, value, id, \
+                backwards) or None if the cursor is invalid
+        """
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            order_by, value, last_id, backwards = json.loads(payload)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            return None
+        if not isinstance(order_by, str) or not isinstance(backwards, bool):
+            return None
+        attr = order_by[1:] if order_by.startswith("-") else order_by
+        valid_attributes = ("id",) + cls.get_attributes(target_cls)
+        if attr not in valid_attributes or not isinstance(last_id, int):
+            return None
+        return {
+            "order_by": order_by,
+            "value": value,
+            "id": last_id,
+            "backwards": backwards,
+        }
+
     @classmethod
     def manage_next_previous_page(
         cls,
         request,
         data: List[Dict],
-        nb_total_data: int,
+        nb_total_data: Optional[int],
         limit: int,
-        offset: int,
+        offset: Optional[int],
+        order_by: Optional[str] = None,
+        position: Optional[Dict[str, Any]] = None,
+        has_more: bool = False,
     ) -> Dict[str, Any]:
         """Manage next/previous data link(url)
 
         Args:
             request (Request): current request
             data (Dict[str, Any]): request response data
-            nb_total_data (int): total number of resources from DB
+            nb_total_data (Optional[int]): total number of resources from DB, \
+                None if unknown or approximate
             limit (int): limit quantity of returned data
             offset (int): offset of returned data
+            order_by (Optional[str]): valid order, enables cursor links
+            position (Optional[Dict[str, Any]]): decoded cursor of \
+                the current page (cursor mode only)
+            has_more (bool): more rows exist after the current page \
+                (in the fetching direction for cursor mode)
 
         Returns:
             Dict[str, Any]: response
         """
+        if order_by is not None:
+            return cls._manage_cursor_page(
+                request, data, limit, order_by, position, has_more
+            )
         data = {"next": None, "previous": None, "users": data}
+        if nb_total_data is None:
+            # unknown or approximate total: rely on the rows found after the page
+            has_next, has_previous = has_more, offset - limit >= 0
+        else:
+            has_next = offset + limit < nb_total_data and limit <= nb_total_data
+            has_previous = offset - limit >= 0 and limit <= nb_total_data
 
         # manage next data
-        base = request.scope.get("path")
-        if offset + limit < nb_total_data and limit <= nb_total_data:
+        if has_next:
             next_offset = offset + limit
-            data["next"] = f"{base}?limit={limit}&offset={next_offset}"
+            data["next"] = cls._page_url(request, limit, offset=next_offset)
 
         # manage previous data
-        if offset - limit >= 0 and limit <= nb_total_data:
+        if has_previous:
             previous_offset = offset - limit
-            data["previous"] = f"{base}?limit={limit}&offset={previous_offset}"
+            data["previous"] = cls._page_url(request, limit, offset=previous_offset)
         return data
 
     @classmethod
-    async def insert_default_data(cls, data=INIT_DATA, quantity: int = -1) -> None:
-        """Init `person` table with some default users\n
+    def _manage_cursor_page(
+        cls,
+        request,
+        data: List[Dict[str, Any]],
+        limit: int,
+        order_by: str,
+        position: Optional[Dict[str, Any]],
+        has_more: bool,
+    ) -> Dict[str, Any]:
+        """Manage next/previous cursor links
+            called by manage_next_previous_page function\n
+
+        Returns:
+            Dict[str, Any]: response
+        """
+        response = {"next": None, "previous": None, "users": data}
+        if not data:
+            return response
+
+        backwards = position is not None and position["backwards"]
+        # a backwards page always has the rows it came from after it
+        if has_more or backwards:
+            cursor = cls.encode_cursor(order_by, data[-1])
+            response["next"] = cls._page_url(request, limit, cursor=cursor)
+        if (has_more and backwards) or (position is not None and not backwards):
+            cursor = cls.encode_cursor(order_by, data[0], backwards=True)
+            response["previous"] = cls._page_url(request, limit, cursor=cursor)
+        return response
+
+    @classmethod
+    def _page_url(cls, request, limit: int, **page: Any) -> str:
+        """Build a next/previous link keeping the other query parameters
+            (sort, fields...) of the current request\n
 
         Args:
-            data ([type], optional): data to load. Defaults to INIT_DATA.
-            max_data (int, optional): quantity of data to load. \
-                Defaults to -1.
+            request (Request): current request
+            limit (int): limit quantity of returned data
+            page (Any): offset or cursor of the linked page
+
+        Returns:
+            str: url
+        """
+        query = [("limit", limit), *page.items()]
+        query_params = QueryParams(request.scope.get("query_string", b""))
+        query += [
+            (key, value)
+            for key, value in query_params.multi_items()
+            if key not in ("limit", "offset", "cursor")
+        ]
+        return f"{request.scope.get('path')}?{urlencode(query)}"
+
+    @classmethod
+    def valid_fields(
+        cls: Type[MODEL], target_cls: BaseModel, fields: str
+    ) -> Optional[Tuple[str, ...]]:
+        """Validator for sparse fieldsets: comma separated attributes,\
+            the ID is always returned\n
+
+        Args:\n
+            cls (API_functools): utility class that used to call this method\n
+            target_cls (BaseModel): model for db data\n
+            fields (str): string to valid from http request. \
+                ex: first_name,last_name\n
+
+        Returns:\n
+            Optional[Tuple[str, ...]]: ID and requested attributes \
+                or None if an attribute is invalid
+        """
+        valid_attributes = cls.get_attributes(target_cls)
+        selected = ["id"]
+        for attr in fields.lower().split(","):
+            attr = attr.strip()
+            if attr not in ("id",) + valid_attributes:
+                return None
+            if attr not in selected:
+                selected.append(attr)
+        return tuple(selected)
+
+    @classmethod
+    async def insert_default_data(
+        cls,
+        data: Iterable[Dict[str, Any]] = INIT_DATA,
+        quantity: int = -1,
+        batch_size: int = LOAD_BATCH_SIZE,
+        concurrency: int = LOAD_CONCURRENCY,
+    ) -> Dict[str, float]:
+        """Init `person` table with some default users, \
+            inserted by bulk_create batches, a few batches at once\n
+
+        Args:
+            data (Iterable[Dict[str, Any]], optional): data to load, \
+                read lazily. Defaults to INIT_DATA.
+            quantity (int, optional): quantity of data to load, \
+                all data if lower than 1. Defaults to -1.
+            batch_size (int, optional): users per batch. Defaults to LOAD_BATCH_SIZE.
+            concurrency (int, optional): batches inserted at once. \
+                Defaults to LOAD_CONCURRENCY.
+        Returns:\n
+            Dict[str, float]: inserted rows, duration (seconds) and rows per second
+        """
+        if quantity >= 1:
+            data = islice(data, quantity)
+        batches = cls._batches(data, batch_size)
+
+        async def worker() -> int:
+            # workers share the batches iterator: each batch is inserted once
+            inserted = 0
+            for batch in batches:
+                inserted += await cls._create_default_persons(batch)
+            return inserted
+
+        start = time.perf_counter()
+        rows = sum(await asyncio.gather(*(worker() for _ in range(max(concurrency, 1)))))
+        seconds = time.perf_counter() - start
+        Database.invalidate_count(Person)
+        response_cache.clear()
+        return {
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else 0.0,
+        }
+
+    @classmethod
+    def _batches(
+        cls, data: Iterable[Dict[str, Any]], batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Split data into lists of batch_size users
+            called by insert_default_data function\n
+
+        Args:\n
+            data (Iterable[Dict[str, Any]]): users data\n
+            batch_size (int): users per list\n
+
+        Returns:\n
+            Iterator[List[Dict[str, Any]]]: batches, built on demand
+        """
+        iterator = iter(data)
+        return iter(lambda: list(islice(iterator, max(batch_size, 1))), [])
+
+    @classmethod
+    async def _create_default_persons(cls, users: List[Dict[str, Any]]) -> int:
+        """Insert a batch of persons into `person` table with bulk_create
+            called by insert_default_data function\n
+
+        A batch holding an already stored email (emails are unique) is rolled
+        back and inserted again one person at a time, skipping stored emails.
+
+        Args:\n
+            users (List[Dict[str, Any]]): users data to insert according \
+                to person model\n
+
         Returns:\n
-            None: nothing
+            int: number of inserted persons
         """
-        data_length = len(INIT_DATA)
-        quantity = quantity if data_length >= quantity >= 1 else data_length
-        data = data[:quantity]
-        with futures.ProcessPoolExecutor() as executor:
-            for user in data:
-                executor.map(await cls._create_default_person(user))
+        try:
+            await Person.bulk_create([Person(**user) for user in users])
+            return len(users)
+        except IntegrityError:
+            created = [await cls._create_default_person(user) for user in users]
+            return sum(person is not None for person in created)
 
     @classmethod
-    async def _create_default_person(cls, user: dict) -> Person:
+    async def _create_default_person(cls, user: dict) -> Optional[Person]:
         """Insert person into `person` table
             called by insert_default_data function\n
 
@@ -152,6 +387,10 @@ class API_functools:
             user (dict): user data to insert according to person model\n
 
         Returns:\n
-            Person: inserted person
+            Optional[Person]: inserted person, None if its email is \
+            already stored (emails are unique)
         """
-        return await Person.create(**user)
+        try:
+            return await Person.create(**user)
+        except IntegrityError:
+            return None
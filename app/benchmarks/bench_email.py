@@ -0,0 +1,74 @@
+"""Email validation throughput, uncached vs cached validation results
+
+Validates --number PartialUser payloads whose emails are drawn from
+--emails distinct addresses (PATCH/PUT send the same addresses again),
+once with a validate_email call per payload as before, once with the
+cached email_error. With --dns, deliverability (DNS lookups) is checked
+too, uncached then through deliverability_cache as undeliverable_emails
+does off the event loop.
+
+    python -m benchmarks.bench_email [--number 20000] [--emails 500] [--dns]
+"""
+import argparse
+import time
+from unittest import mock
+
+from api.api_v1.models import pydantic as models
+from api.api_v1.models.pydantic import (
+    PartialUser,
+    deliverability_cache,
+    deliverability_error,
+    email_error,
+)
+from api.api_v1.storage.generator import generate_users
+
+
+MISSING = object()
+
+
+def check_deliverability(email: str, cached: bool) -> None:
+    if not cached:
+        deliverability_error(email)
+    elif deliverability_cache.get(email, MISSING) is MISSING:
+        error, cacheable = deliverability_error(email)
+        if cacheable:
+            deliverability_cache.set(email, error)
+
+
+def run(payloads: list, dns: bool, cached: bool) -> float:
+    start = time.perf_counter()
+    for payload in payloads:
+        user = PartialUser.parse_obj(payload)
+        if dns:
+            check_deliverability(user.email, cached)
+    return len(payloads) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--dns", action="store_true")
+    args = parser.parse_args()
+
+    users = list(generate_users(args.emails, seed=0))
+    payloads = [
+        {attr: users[n % len(users)][attr] for attr in PartialUser.attributes()}
+        for n in range(args.number)
+    ]
+
+    # before: no cache, every payload calls email_validator
+    with mock.patch.object(models, "email_error", email_error.__wrapped__):
+        uncached = run(payloads, args.dns, cached=False)
+    email_error.cache_clear()
+    deliverability_cache.clear()
+    cached = run(payloads, args.dns, cached=True)
+
+    checks = "syntax + DNS" if args.dns else "syntax"
+    print(f"uncached {uncached:10.0f} validations/s ({checks})")
+    print(f"cached   {cached:10.0f} validations/s ({cached / uncached:.1f}x)")
+    print(f"{args.number} payloads, {args.emails} distinct emails")
+
+
+if __name__ == "__main__":
+    main()
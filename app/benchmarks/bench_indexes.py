@@ -0,0 +1,126 @@
+"""Query plan and latency of the user endpoints, without and with indexes (PostgreSQL)
+
+Fills the person table of the configured database (TORTOISE_ORM settings)
+up to --rows generated users and creates the indexes (Database.indexes_sql).
+Each endpoint query is then run with EXPLAIN ANALYZE, once in a
+transaction where the person indexes are dropped then rolled back, once
+with them. Use a scratch database.
+
+    python -m benchmarks.bench_indexes [--rows 1000000] [--number 3]
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, List, Tuple
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from api.api_v1.models.tortoise import Person, PERSON_FIELDS
+from api.api_v1.settings import TORTOISE_ORM
+from api.api_v1.storage.database import Database
+from benchmarks.bench_search import fill
+
+INDEXES_SQL = """
+SELECT indexname FROM pg_indexes
+WHERE tablename = 'person' AND indexname NOT LIKE '%pkey'
+"""
+
+
+async def endpoint_queries(rows: int) -> Dict[str, str]:
+    [middle] = await Person.filter(id=rows // 2).values("id", "last_name", "email")
+    email = middle["email"].replace("'", "''")
+    position = {"value": middle["last_name"], "id": middle["id"], "backwards": False}
+    return {
+        "GET /users?sort=last_name:asc&offset=50000": Person.all()
+        .order_by("last_name")
+        .offset(50000)
+        .limit(21)
+        .values(*PERSON_FIELDS)
+        .sql(),
+        "GET /users?sort=last_name:asc&cursor=...": Database.keyset_paginate(
+            Person.all(), "last_name", 21, {"order_by": "last_name", **position}
+        )
+        .values(*PERSON_FIELDS)
+        .sql(),
+        "GET /users/filter/email:eq/...": Person.filter(
+            *Database.query_filter_builder("email:eq", middle["email"])
+        )
+        .order_by("id")
+        .limit(21)
+        .values(*PERSON_FIELDS)
+        .sql(),
+        "GET /users/filter/country_of_birth:eq/...": Person.filter(
+            *Database.query_filter_builder("country_of_birth:eq", "Country 7")
+        )
+        .order_by("id")
+        .limit(21)
+        .values(*PERSON_FIELDS)
+        .sql(),
+        "GET /users/filter/is_admin:eq/true": Person.filter(
+            *Database.query_filter_builder("is_admin:eq", "true")
+        )
+        .order_by("id")
+        .limit(21)
+        .values(*PERSON_FIELDS)
+        .sql(),
+        # unique index lookup, ex: email already taken
+        "POST /users (email check)": (
+            f'SELECT "id" FROM "person" WHERE LOWER("email") = LOWER(\'{email}\')'
+        ),
+    }
+
+
+async def explain(conn, sql: str) -> Tuple[str, float]:
+    rows = await conn.execute_query_dict(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")
+    plan = rows[0]["QUERY PLAN"]
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    node, names = plan[0]["Plan"], []
+    while node is not None:
+        index = f" ({node['Index Name']})" if "Index Name" in node else ""
+        names.append(node["Node Type"] + index)
+        node = (node.get("Plans") or [None])[0]
+    return " > ".join(names), plan[0]["Execution Time"]
+
+
+async def run(sql: str, number: int, indexes: List[str]) -> Tuple[str, float]:
+    best = ("", float("inf"))
+    for _ in range(number):
+        async with in_transaction() as conn:
+            for name in indexes:
+                await conn.execute_script(f'DROP INDEX "{name}"')
+            result = await explain(conn, sql)
+            # keep the indexes
+            await conn.rollback()
+        best = min(best, result, key=lambda r: r[1])
+    return best
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--number", type=int, default=3)
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    try:
+        assert Database.is_postgres(Person), "PostgreSQL only"
+        await fill(args.rows)
+        assert await Database.create_indexes(Person), "duplicate emails"
+        indexes = [
+            row["indexname"]
+            for row in await Person._meta.db.execute_query_dict(INDEXES_SQL)
+        ]
+
+        for endpoint, sql in (await endpoint_queries(args.rows)).items():
+            print(endpoint)
+            for mode, dropped in (("no index", indexes), ("indexed", [])):
+                plan, duration = await run(sql, args.number, dropped)
+                print(f"  {mode:<9} {duration:10.2f} ms  {plan}")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""CPU cost of rendering a GET /api/v1/users/ page
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json JSONResponse)
+with FastJSONResponse (orjson, no jsonable_encoder), from Person_Pydantic
+models and from .values() rows (projection read path).
+
+    python -m benchmarks.bench_json [--rows 100] [--number 200]
+"""
+import argparse
+import timeit
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.api_v1.models.tortoise import Person_Pydantic, PERSON_FIELDS
+from api.api_v1.responses import FastJSONResponse
+from api.api_v1.storage.initial_data import INIT_DATA
+
+
+def page(rows: int) -> dict:
+    users = [
+        Person_Pydantic(id=n, **INIT_DATA[n % len(INIT_DATA)]) for n in range(1, rows + 1)
+    ]
+    return {
+        "next": "/api/v1/users/?limit=100&offset=100",
+        "previous": None,
+        "users": users,
+    }
+
+
+def values_page(content: dict) -> dict:
+    # same python values as Person.all().values(*PERSON_FIELDS)
+    users = [
+        {field: getattr(user, field) for field in PERSON_FIELDS}
+        for user in content["users"]
+    ]
+    return {**content, "users": users}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    content = page(args.rows)
+    rows = values_page(content)
+    default_body = JSONResponse(jsonable_encoder(content)).body
+    fast_body = FastJSONResponse(content).body
+    assert default_body == fast_body == FastJSONResponse(rows).body, "responses differ"
+
+    scenes = {
+        "jsonable_encoder + json": lambda: JSONResponse(jsonable_encoder(content)),
+        "FastJSONResponse": lambda: FastJSONResponse(content),
+        "FastJSONResponse values": lambda: FastJSONResponse(rows),
+    }
+    results = {}
+    for name, render in scenes.items():
+        best = min(timeit.repeat(render, number=args.number, repeat=5))
+        results[name] = best / args.number * 1e6
+        print(f"{name:<33} {results[name]:10.1f} µs/request")
+    default = results["jsonable_encoder + json"]
+    for name in list(scenes)[1:]:
+        print(
+            f"saved by {name:<24} {default - results[name]:10.1f} µs/request "
+            f"({default / results[name]:.1f}x faster)"
+        )
+    print(f"{args.rows} rows, {len(fast_body)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Filter endpoint query time, table scan vs trigram indexes (PostgreSQL)
+
+Fills the person table of the configured database (TORTOISE_ORM settings)
+up to --rows generated users, creates the trigram indexes, then times the
+queries GET /api/v1/users/filter/{user_attribute}/{value} runs, with index
+scans disabled (sequential scan) and enabled. Use a scratch database.
+
+    python -m benchmarks.bench_search [--rows 1000000] [--number 5]
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from api.api_v1.models.tortoise import Person, PERSON_FIELDS
+from api.api_v1.settings import TORTOISE_ORM
+from api.api_v1.storage.database import Database
+
+# names made of md5 digits: "ab1" matches a few rows, "abcd" almost none
+FILL_SQL = """
+INSERT INTO "person" (
+    "is_admin", "first_name", "last_name", "email", "gender",
+    "date_of_birth", "country_of_birth"
+)
+SELECT
+    n % 100 = 0,
+    initcap(substr(md5(n::text), 1, 8)),
+    initcap(substr(md5((n + 1)::text), 1, 10)),
+    substr(md5(n::text), 1, 8) || n || '@example.com',
+    (ARRAY['Male', 'Female'])[1 + n % 2],
+    DATE '1950-01-01' + n % 20000,
+    'Country ' || n % 200
+FROM generate_series($1::int, $2::int) AS n
+"""
+
+SEARCHES = [
+    ("first_name", "ab1"),
+    ("first_nameOrlast_name", "ab1"),
+    ("email", "abcd"),
+    ("first_nameAndcountry_of_birth", "1"),
+]
+
+
+async def fill(rows: int) -> None:
+    count = await Person.all().count()
+    if count < rows:
+        print(f"inserting {rows - count} rows...")
+        await Person._meta.db.execute_query(FILL_SQL, [count + 1, rows])
+        await Person._meta.db.execute_script('ANALYZE "person"')
+
+
+async def best_time(query: Callable[..., Awaitable], number: int, scan: bool) -> float:
+    best = float("inf")
+    for _ in range(number):
+        async with in_transaction() as conn:
+            if scan:
+                await conn.execute_script(
+                    "SET LOCAL enable_indexscan = off; SET LOCAL enable_bitmapscan = off"
+                )
+            start = time.perf_counter()
+            await query(conn)
+            best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--number", type=int, default=5)
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    try:
+        assert Database.is_postgres(Person), "PostgreSQL only"
+        await fill(args.rows)
+        assert await Database.create_search_indexes(Person), "pg_trgm unavailable"
+
+        for attribute, value in SEARCHES:
+            queryset = Person.filter(*Database.query_filter_builder(attribute, value))
+            queries = {
+                "page": lambda conn: queryset.using_db(conn)
+                .order_by("id")
+                .limit(20)
+                .values(*PERSON_FIELDS),
+                "count": lambda conn: queryset.using_db(conn).count(),
+            }
+            for name, query in queries.items():
+                scan = await best_time(query, args.number, scan=True)
+                indexed = await best_time(query, args.number, scan=False)
+                print(
+                    f"{attribute}/{value:<6} {name:<6} seq scan {scan:9.1f} ms  "
+                    f"trigram {indexed:9.1f} ms  ({scan / indexed:.1f}x)"
+                )
+        print(f"{await Person.all().count()} rows")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
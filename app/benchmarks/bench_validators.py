@@ -0,0 +1,111 @@
+"""User validators and model construction cost on generated records
+
+Times the avatar and name validators as they were (pattern passed to
+re.match, .title().strip().lower() copies) and as they are (precompiled
+pattern, no redundant copies), then building User models with
+parse_obj (validation) and trusted (no validation, already valid data),
+then validating the records one model at a time (parse_obj per record)
+and one column at a time (validate_many, bulk endpoints), email
+validation cache cleared.
+
+    python -m benchmarks.bench_validators [--records 100000]
+"""
+import argparse
+import re
+import time
+from typing import Callable, List
+
+from pydantic import BaseConfig, ValidationError
+from pydantic.fields import ModelField
+
+from api.api_v1.models.pydantic import PartialUser, User, email_error
+from api.api_v1.storage.generator import generate_users
+
+FIELD = ModelField(name="name", type_=str, class_validators={}, model_config=BaseConfig)
+
+
+def legacy_url(value: str) -> str:
+    value = value.title().strip().lower()
+    patt = r"(https?:\/\/(www\.)?|(www\.))([\w\-\_\.]+)(\.[a-z]{2,10})(\/.+)?"
+    if re.match(patt, value) is None:
+        raise ValueError("avatar must be a valid url.")
+    return value
+
+
+def legacy_name(value: str) -> str:
+    str_to_validate = value.title().strip()
+    if not (3 <= len(str_to_validate) <= 50):
+        raise ValueError("name must contain between 3 and 50 characters.")
+    return value
+
+
+def best(function: Callable, values: List) -> float:
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for value in values:
+            function(value)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    users = list(generate_users(args.records, seed=0))
+    avatars = [user["avatar"] for user in users]
+    names = [user["last_name"] for user in users]
+    scenes = {
+        "avatar validator": (
+            lambda value: legacy_url(value),
+            lambda value: PartialUser.valid_url_avatar(value, field=FIELD),
+            avatars,
+        ),
+        "name validator": (
+            lambda value: legacy_name(value),
+            lambda value: PartialUser.between_3_and_50_characters(value, field=FIELD),
+            names,
+        ),
+    }
+    for name, (before, after, values) in scenes.items():
+        before_time, after_time = best(before, values), best(after, values)
+        print(
+            f"{name:<17} before {before_time * 1e3:8.1f} ms  "
+            f"after {after_time * 1e3:8.1f} ms  ({before_time / after_time:.1f}x)"
+        )
+
+    typed = [User.parse_obj(user).dict() for user in users]
+    parsed, trusted = best(User.parse_obj, users), best(User.trusted, typed)
+    print(
+        f"{'User':<17} parse_obj {parsed * 1e3:8.1f} ms  "
+        f"trusted {trusted * 1e3:8.1f} ms  ({parsed / trusted:.1f}x)"
+    )
+
+    def per_row() -> None:
+        for user in users:
+            try:
+                User.parse_obj(user).dict()
+            except ValidationError:
+                pass
+
+    durations = {}
+    for name, function in (
+        ("parse_obj", per_row),
+        ("validate_many", lambda: User.validate_many(users)),
+    ):
+        email_error.cache_clear()
+        start = time.perf_counter()
+        function()
+        durations[name] = time.perf_counter() - start
+    rows, columns = durations["parse_obj"], durations["validate_many"]
+    print(
+        f"{'bulk':<17} parse_obj {rows * 1e3:8.1f} ms  "
+        f"validate_many {columns * 1e3:8.1f} ms  ({rows / columns:.1f}x)"
+    )
+    print(f"{args.records} records")
+
+
+if __name__ == "__main__":
+    main()
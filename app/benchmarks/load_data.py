@@ -0,0 +1,53 @@
+"""Build a benchmark database of synthetic users
+
+Appends --rows generated users (see storage.generator) to the person table of
+the configured database (TORTOISE_ORM settings) with the batched default data
+loader, then creates the indexes. The same --seed gives the same users.
+
+    python -m benchmarks.load_data [--rows 1000000] [--seed 0]
+        [--batch-size 1000] [--concurrency 4]
+"""
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from api.api_v1.models.tortoise import Person
+from api.api_v1.settings import TORTOISE_ORM, LOAD_BATCH_SIZE, LOAD_CONCURRENCY
+from api.api_v1.storage.database import Database
+from api.api_v1.storage.generator import generate_users
+from api.utils import API_functools
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=LOAD_CONCURRENCY)
+    args = parser.parse_args()
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    await Tortoise.generate_schemas()
+    try:
+        start = await Person.all().count()
+        report = await API_functools.insert_default_data(
+            data=generate_users(args.rows, args.seed, start),
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+        )
+        print(
+            f"{report['rows']} rows in {report['seconds']:.1f} s "
+            f"({report['rows_per_second']:.0f} rows/s)"
+        )
+        await Database.create_indexes(Person)
+        if Database.is_postgres(Person):
+            await Database.create_search_indexes(Person)
+            await Person._meta.db.execute_script('ANALYZE "person"')
+        print(f"{await Person.all().count()} rows")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,8 +7,11 @@ from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
 
 from api.api_v1.api import router as api_router
+from api.api_v1.models.tortoise import Person
 from api.api_v1.storage.database import Database
-from api.api_v1.settings import CORS_MIDDLEWARE_CONFIG
+from api.api_v1.storage.generator import generate_users
+from api.api_v1.settings import CORS_MIDDLEWARE_CONFIG, WRITE_COALESCING
+from api.api_v1.storage.coalescer import create_coalescer
 from api.utils import API_functools
 
 API_BASE_URL = "/api/v1"
@@ -23,14 +26,43 @@ app.add_middleware(CORSMiddleware, **CORS_MIDDLEWARE_CONFIG)
 
 
 @app.get("/data", status_code=status.HTTP_301_MOVED_PERMANENTLY)
-async def load_fake_data(quantity: Optional[int] = 0) -> Dict[str, Any]:
-    """loading fake data
+async def load_fake_data(
+    quantity: Optional[int] = 0, seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """loading fake data, default users or `quantity` synthetic users \
+    if a seed is given
 
     Returns:
-        redirect to root path /
+        redirect to root path /, X-Rows and X-Rows-Per-Second \
+        headers report the load
     """
-    await API_functools.insert_default_data(quantity=quantity)
-    return RedirectResponse(url="/")
+    if seed is None:
+        report = await API_functools.insert_default_data(quantity=quantity)
+    else:
+        # numbered after the stored users: generated emails stay unique
+        users = generate_users(quantity, seed, start=await Person.all().count())
+        report = await API_functools.insert_default_data(data=users)
+    return RedirectResponse(
+        url="/",
+        headers={
+            "X-Rows": str(report["rows"]),
+            "X-Rows-Per-Second": f"{report['rows_per_second']:.0f}",
+        },
+    )
+
+
+@app.get("/stats", status_code=status.HTTP_200_OK)
+async def stats() -> Dict[str, Any]:
+    """runtime metrics
+
+    Returns:
+        Dict[str, Any]: POST /users write coalescer flush size and latency, \
+        database connection pool usage
+    """
+    return {
+        "coalescer": {"enabled": WRITE_COALESCING, **create_coalescer.stats()},
+        "database": Database.pool_stats(Person),
+    }
 
 
 @app.get("/", status_code=status.HTTP_200_OK)
@@ -44,6 +76,7 @@ async def index() -> Dict[str, Any]:
         "detail": "Welcome to FastAPI",
         "apis": ["/api/v1/users"],
         "fake_data": "/data",
+        "stats": "/stats",
         "docs": ["/docs", "/redoc"],
         "openapi": "/openapi.json",
     }
@@ -2,6 +2,10 @@ import pytest
 from tortoise.contrib.test import finalizer, initializer
 
 from api.api_v1 import settings
+from api.api_v1.models.tortoise import Person
+from api.api_v1.storage.database import Database
+from api.api_v1.storage.cache import response_cache
+from api.api_v1.models.pydantic import deliverability_cache, email_error
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -12,3 +16,15 @@ def initialize_tests(request):
         app_label="models",
     )
     request.addfinalizer(finalizer)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # each test starts with an empty database
+    Database.invalidate_count(Person)
+    response_cache.clear()
+    # tests write rows directly through the ORM, responses are cached on demand
+    response_cache.ttl = 0
+    # email validation results depend on the mocks of each test
+    email_error.cache_clear()
+    deliverability_cache.clear()
@@ -0,0 +1,94 @@
+from unittest.mock import patch
+
+from fastapi import Request, Response, status
+from tortoise.contrib import test
+
+from api.api_v1.storage.cache import TTLCache, cached_response, request_key
+
+
+class TestCache(test.TestCase):
+    def test_get_set_delete(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        assert cache.get("a") is None
+        assert cache.get("a", 0) == 0
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert len(cache) == 1
+        cache.delete("a")
+        cache.delete("a")
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" becomes the least recently used
+        cache.set("c", 3)
+        assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    def test_ttl_expiration(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with patch("api.api_v1.storage.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with patch("api.api_v1.storage.cache.time.monotonic", return_value=109):
+            assert cache.get("a") == 1
+        with patch("api.api_v1.storage.cache.time.monotonic", return_value=110):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_disabled(self):
+        for cache in (TTLCache(maxsize=0, ttl=10), TTLCache(maxsize=2, ttl=0)):
+            cache.set("a", 1)
+            assert cache.get("a") is None
+
+    def test_request_key(self):
+        def request(path, query=b""):
+            scope = {"type": "http", "path": path, "query_string": query, "headers": []}
+            return Request(scope)
+
+        assert request_key(request("/users/", b"b=2&a=1")) == request_key(
+            request("/users", b"a=1&b=2")
+        )
+        assert request_key(request("/")) == ("/", ())
+        assert request_key(request("/users", b"a=1")) != request_key(request("/users"))
+
+    async def test_cached_response(self):
+        calls = []
+
+        @cached_response(TTLCache(maxsize=2, ttl=10))
+        async def endpoint(request: Request, res: Response, value: int):
+            calls.append(value)
+            res.status_code = status.HTTP_404_NOT_FOUND
+            res.headers["X-Value"] = str(value)
+            return {"value": value}
+
+        request = Request(
+            {"type": "http", "path": "/", "query_string": b"", "headers": []}
+        )
+        for value in (1, 2):
+            res = Response()
+            assert await endpoint(request=request, res=res, value=value) == {"value": 1}
+            assert res.status_code == status.HTTP_404_NOT_FOUND
+            assert res.headers["X-Value"] == "1"
+        assert calls == [1]
+
+    async def test_cached_response_cleared_meanwhile(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+
+        @cached_response(cache)
+        async def endpoint(request: Request, res: Response):
+            # a write commits and clears the cache while the read runs
+            cache.clear()
+            return {"value": "stale"}
+
+        request = Request(
+            {"type": "http", "path": "/", "query_string": b"", "headers": []}
+        )
+        generation = cache.generation
+        assert await endpoint(request=request, res=Response()) == {"value": "stale"}
+        assert cache.generation == generation + 1
+        assert len(cache) == 0
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from unittest import mock
+
+from fastapi import status
+from httpx import AsyncClient
+from tortoise.contrib import test
+from tortoise.exceptions import IntegrityError
+
+from main import app
+from api.api_v1.models.tortoise import Person
+from api.api_v1.storage.database import Database
+from api.api_v1.storage.coalescer import WriteCoalescer, create_coalescer
+from api.api_v1.storage.initial_data import INIT_DATA
+
+BASE_URL = "http://127.0.0.1:8000"
+API_ROOT = "/api/v1/users/"
+
+
+class TestWriteCoalescer(test.TestCase):
+    async def test_insert(self):
+        coalescer = WriteCoalescer(Person, max_rows=3, window=0.001)
+        db = Person._meta.db
+        execute_query = db.execute_query
+
+        async def reversed_returning(query, values):
+            count, rows = await execute_query(query, values)
+            return count, rows[::-1]
+
+        # RETURNING rows in another order: each caller still gets its own ID
+        with mock.patch.object(
+            Database, "insert_many", wraps=Database.insert_many
+        ) as insert_many, mock.patch.object(
+            db, "execute_query", side_effect=reversed_returning
+        ):
+            ids = await asyncio.gather(
+                *(coalescer.insert(user) for user in INIT_DATA[:5])
+            )
+        # 3 rows flushed at once, the last 2 after the window
+        assert [len(call.args[1]) for call in insert_many.call_args_list] == [3, 2]
+        users = await Person.filter(id__in=ids).values("id", "email")
+        assert {user["id"]: user["email"] for user in users} == {
+            pk: user["email"] for pk, user in zip(ids, INIT_DATA[:5])
+        }
+
+        stats = coalescer.stats()
+        assert stats["flushes"] == 2 and stats["rows"] == 5
+        assert stats["mean_flush_size"] == 2.5 and stats["max_flush_size"] == 3
+        assert stats["max_wait_ms"] >= stats["mean_wait_ms"] > 0
+        assert stats["max_flush_ms"] >= stats["mean_flush_ms"] > 0
+        coalescer.reset_stats()
+        assert coalescer.stats()["flushes"] == 0
+        assert coalescer.stats()["mean_wait_ms"] == 0
+
+    async def test_insert_errors(self):
+        coalescer = WriteCoalescer(Person, max_rows=10, window=0.001)
+        stored = INIT_DATA[1]["email"]
+        insert_many = Database.insert_many
+
+        async def insert_unique(model, rows, chunk_size):
+            if any(row["email"] == stored for row in rows):
+                raise IntegrityError("email already exists")
+            return await insert_many(model, rows, chunk_size)
+
+        with mock.patch.object(Database, "insert_many", side_effect=insert_unique):
+            results = await asyncio.gather(
+                *(coalescer.insert(user) for user in INIT_DATA[:3]),
+                return_exceptions=True,
+            )
+        # only the failing row gets the error
+        assert isinstance(results[1], IntegrityError)
+        assert await Person.filter(id__in=results[::2]).count() == 2
+
+        # a cancelled caller doesn't stop the flush
+        task = asyncio.ensure_future(coalescer.insert(INIT_DATA[3]))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert await Person.filter(email=INIT_DATA[3]["email"]).exists()
+
+    async def test_create_user_coalescing(self):
+        create_coalescer.reset_stats()
+        users = INIT_DATA[:4]
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch(
+            "api.api_v1.endpoints.persons.WRITE_COALESCING", True
+        ):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                responses = await asyncio.gather(
+                    *(ac.post(API_ROOT, data=json.dumps(user)) for user in users)
+                )
+        assert [response.status_code for response in responses] == [
+            status.HTTP_201_CREATED
+        ] * len(users)
+        created = [response.json() for response in responses]
+        assert [
+            {"id": user["id"], **data} for user, data in zip(created, users)
+        ] == created
+        stored = await Person.all().order_by("id").values_list("id", flat=True)
+        assert sorted(user["id"] for user in created) == stored
+
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get("/stats")
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()["coalescer"]
+        assert stats["enabled"] is False
+        assert response.json()["database"]["pooled"] is False
+        assert stats["rows"] == len(users)
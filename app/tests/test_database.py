@@ -1,9 +1,17 @@
+import asyncio
 import concurrent.futures as futures
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
 
+import pytest
 from tortoise.contrib import test
+from tortoise.exceptions import IntegrityError
 from tortoise.query_utils import Q
 from main import app
-from api.api_v1.storage.database import Database
+from api.api_v1.models.tortoise import Person, Person_Pydantic
+from api.api_v1.settings import DATABASE_POOL, TORTOISE_ORM
+from api.api_v1.storage.database import Database, SEARCH_FIELDS, SORT_FIELDS
+from api.api_v1.storage.initial_data import INIT_DATA
 
 
 class TestDatabase(test.TestCase):
@@ -11,6 +19,27 @@ class TestDatabase(test.TestCase):
         with futures.ThreadPoolExecutor() as executor:
             # Connection OK
             assert executor.submit(Database.connect, application=app).result() is True
+            # trigram indexes are created once the tables exist
+            handler = app.router.on_startup[-1]
+            assert handler.__name__ == "create_indexes"
+            with patch.object(
+                Database, "create_indexes", AsyncMock()
+            ) as create, patch.object(
+                Database, "create_search_indexes", AsyncMock()
+            ) as create_search:
+                executor.submit(asyncio.run, handler()).result()
+                create.assert_awaited_once_with(Person)
+                create_search.assert_awaited_once_with(Person)
+
+                # PostgreSQL: built in the background, startup doesn't wait
+                async def startup():
+                    await handler()
+                    assert not Database._index_build.done()
+                    await Database._index_build
+
+                with patch.object(Database, "is_postgres", return_value=True):
+                    executor.submit(asyncio.run, startup()).result()
+                assert create.await_count == create_search.await_count == 2
             # Connection NOK
             assert executor.submit(Database.connect).result() is False
 
@@ -67,3 +96,252 @@ class TestDatabase(test.TestCase):
             assert len(Database.query_filter_builder(scene["attr"], value)) == len(
                 scene["expected"]
             )
+
+    def test_keyset_filter(self):
+        value, last_id = "john", 3
+        scenes = [
+            # attr, value, ascending, nulls_last, expected
+            ("id", None, True, False, Q(id__gt=last_id)),
+            ("id", None, False, False, Q(id__lt=last_id)),
+            (
+                "first_name",
+                value,
+                True,
+                False,
+                Q(
+                    Q(first_name__gt=value),
+                    Q(first_name=value, id__gt=last_id),
+                    join_type=Q.OR,
+                ),
+            ),
+            (
+                "email",
+                value,
+                False,
+                True,
+                Q(
+                    Q(email__lt=value),
+                    Q(email=value, id__lt=last_id),
+                    Q(email__isnull=True),
+                    join_type=Q.OR,
+                ),
+            ),
+            ("email", None, True, True, Q(email__isnull=True, id__gt=last_id)),
+            (
+                "email",
+                None,
+                True,
+                False,
+                Q(
+                    Q(email__isnull=True, id__gt=last_id),
+                    Q(email__not_isnull=True),
+                    join_type=Q.OR,
+                ),
+            ),
+        ]
+        for attr, val, ascending, nulls_last, expected in scenes:
+            actual = Database.keyset_filter(attr, val, last_id, ascending, nulls_last)
+            assert actual.join_type == expected.join_type
+            assert actual.filters == expected.filters
+            assert [(q.filters, q.join_type) for q in actual.children] == [
+                (q.filters, q.join_type) for q in expected.children
+            ]
+
+    async def test_count(self):
+        await Person.create(**INIT_DATA[0])
+        assert await Database.count(Person) == 1
+        assert await Database.count(Person, "estimated") == 1
+
+        # cached count is reused until invalidated
+        assert await Database.count(Person, "cached") == 1
+        await Person.create(**INIT_DATA[1])
+        assert await Database.count(Person, "cached") == 1
+        Database.invalidate_count(Person)
+        assert await Database.count(Person, "cached") == 2
+
+        # PostgreSQL planner statistics
+        db = Person._meta.db
+        scenes = [
+            ([{"estimate": 1000}], 1000),
+            # never analyzed: -1 since PostgreSQL 14, 0 before
+            ([{"estimate": -1}], 2),
+            ([{"estimate": 0}], 2),
+            ([], 2),
+        ]
+        for rows, expected in scenes:
+            with patch.object(Database, "is_postgres", return_value=True), patch.object(
+                db, "execute_query_dict", AsyncMock(return_value=rows)
+            ):
+                assert await Database.count(Person, "estimated") == expected
+
+    async def test_create_search_indexes(self):
+        statements = Database.search_indexes_sql(Person)
+        assert statements[0] == "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        assert statements[1] == (
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_person_first_name_trgm" '
+            'ON "person" USING GIN (UPPER(CAST("first_name" AS VARCHAR)) gin_trgm_ops)'
+        )
+        assert len(statements) == len(SEARCH_FIELDS) + 1
+
+        # the indexed expression is the one __icontains filters compare
+        query = Person.filter(*Database.query_filter_builder("first_name", "jo")).sql()
+        assert 'UPPER(CAST("first_name" AS VARCHAR)) LIKE' in query
+
+        # SQLite: no trigram index
+        assert await Database.create_search_indexes(Person) is False
+
+        db = Person._meta.db
+        with patch.object(Database, "is_postgres", return_value=True):
+            with patch.object(db, "execute_script", AsyncMock()) as execute:
+                assert await Database.create_search_indexes(Person) is True
+            assert [c.args[0] for c in execute.await_args_list] == statements
+            # pg_trgm not installable
+            with patch.object(db, "execute_script", AsyncMock(side_effect=Exception())):
+                assert await Database.create_search_indexes(Person) is False
+
+    async def test_create_indexes(self):
+        db = Person._meta.db
+        # no index comes with the schema: generate_schemas runs at every startup
+        _, rows = await db.execute_query("PRAGMA index_list('person')")
+        assert rows == []
+
+        # statements work on SQLite (rolled back with the test transaction)
+        for sql in Database.indexes_sql(Person):
+            await db.execute_query(sql)
+        _, rows = await db.execute_query("PRAGMA index_list('person')")
+        assert {row["name"] for row in rows} == {
+            "uid_person_email_lower",
+            "idx_person_admins",
+            *(f"idx_person_{attr}_id" for attr in SORT_FIELDS),
+        }
+        await Person.create(**INIT_DATA[0])
+        with pytest.raises(IntegrityError):
+            await Person.create(
+                **{**INIT_DATA[1], "email": INIT_DATA[0]["email"].upper()}
+            )
+        # users without email
+        for user in INIT_DATA[1:3]:
+            await Person.create(**{**user, "email": None})
+
+        with patch.object(Database, "is_postgres", return_value=True):
+            assert all(
+                "INDEX CONCURRENTLY IF NOT EXISTS" in sql
+                for sql in Database.indexes_sql(Person)
+            )
+        with patch.object(db, "execute_script", AsyncMock()) as execute:
+            assert await Database.create_indexes(Person) is True
+        assert [c.args[0] for c in execute.await_args_list] == Database.indexes_sql(
+            Person
+        )
+        # emails differing only by case are stored
+        with patch.object(db, "execute_script", AsyncMock(side_effect=Exception())):
+            assert await Database.create_indexes(Person) is False
+
+    async def test_insert_many(self):
+        db = Person._meta.db
+        execute_query = db.execute_query
+
+        async def reversed_returning(query, values):
+            count, rows = await execute_query(query, values)
+            return count, rows[::-1]
+
+        rows = [dict(user) for user in INIT_DATA[:5]]
+        # RETURNING order isn't guaranteed: IDs are matched by email
+        with patch.object(db, "execute_query", side_effect=reversed_returning):
+            ids = await Database.insert_many(Person, rows, 2)
+        stored = await Person.filter(id__in=ids).values_list("id", "email")
+        assert ids == [dict((e, i) for i, e in stored)[row["email"]] for row in rows]
+
+        with pytest.raises(ValueError):
+            await Database.insert_many(Person, [rows[0], rows[0]], 2)
+
+    async def test_update_many(self):
+        people = [await Person.create(**user) for user in INIT_DATA[:3]]
+        rows = [
+            {"id": people[0].id, "job": "Tester"},
+            {"id": people[1].id, "job": "Tester", "company": None},
+            {"id": 999, "job": "Nobody"},
+            # nothing sent: matched, unchanged
+            {"id": people[2].id},
+        ]
+        updated = await Database.update_many(Person, rows, ("company", "job"), 1)
+        assert sorted(updated) == [person.id for person in people]
+        stored = await Person.all().order_by("id").values("job", "company")
+        assert stored == [
+            {"job": "Tester", "company": INIT_DATA[0]["company"]},
+            {"job": "Tester", "company": None},
+            {"job": INIT_DATA[2]["job"], "company": INIT_DATA[2]["company"]},
+        ]
+
+    async def test_update_returning(self):
+        person = await Person.create(**INIT_DATA[0])
+        with patch.object(
+            Person._meta.db, "execute_query", wraps=Person._meta.db.execute_query
+        ) as execute:
+            updated = await Database.update_returning(
+                Person, person.id, {"first_name": "Johnny", "job": None}
+            )
+        # single statement, no SELECT
+        assert execute.call_count == 1
+        assert execute.call_args.args[0].startswith('UPDATE "person" SET')
+        assert isinstance(updated, Person) and updated.id == person.id
+        assert (updated.first_name, updated.job) == ("Johnny", None)
+        assert updated.date_of_birth == person.date_of_birth
+        assert updated.last_name == person.last_name
+
+        # nothing to write: the stored row is returned
+        unchanged = await Database.update_returning(Person, person.id, {})
+        assert unchanged.first_name == "Johnny"
+        assert await Database.update_returning(Person, person.id + 1, {}) is None
+
+    async def test_delete_returning(self):
+        person = await Person.create(**INIT_DATA[0])
+        with patch.object(
+            Person._meta.db, "execute_query", wraps=Person._meta.db.execute_query
+        ) as execute:
+            deleted = await Database.delete_returning(Person, person.id)
+        # single statement, no SELECT
+        assert execute.call_count == 1
+        assert execute.call_args.args[0].startswith('DELETE FROM "person"')
+        expected = await Person_Pydantic.from_tortoise_orm(person)
+        assert deleted == expected.dict()
+        assert await Person.filter(id=person.id).exists() is False
+        assert await Database.delete_returning(Person, person.id) is None
+
+    async def test_pool_stats(self):
+        # SQLite: no pool
+        stats = Database.pool_stats(Person)
+        assert stats["pooled"] is False
+        assert stats["size"] == stats["waiters"] == 0
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.LifoQueue()
+        holders = [
+            SimpleNamespace(_con=object(), _in_use=loop.create_future()),
+            SimpleNamespace(_con=object(), _in_use=None),
+            SimpleNamespace(_con=None, _in_use=None),
+        ]
+        pool = SimpleNamespace(_holders=holders, _queue=queue, _minsize=1, _maxsize=3)
+        # two acquires waiting for a connection, one cancelled
+        waiting = [asyncio.ensure_future(queue.get()) for _ in range(3)]
+        await asyncio.sleep(0)
+        waiting[0].cancel()
+        await asyncio.sleep(0)
+        with patch.object(Person._meta.db, "_pool", pool, create=True):
+            assert Database.pool_stats(Person) == {
+                "pooled": True,
+                "min_size": 1,
+                "max_size": 3,
+                "size": 2,
+                "in_use": 1,
+                "idle": 1,
+                "waiters": 2,
+            }
+            # pool not initialized yet
+            pool._queue = None
+            assert Database.pool_stats(Person)["waiters"] == 0
+        for task in waiting:
+            task.cancel()
+        assert TORTOISE_ORM["connections"]["default"]["credentials"].items() >= (
+            DATABASE_POOL.items()
+        )
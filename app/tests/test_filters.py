@@ -0,0 +1,123 @@
+from datetime import date
+
+import pytest
+from tortoise.contrib import test
+from tortoise.query_utils import Q
+
+from api.api_v1.models.tortoise import Person
+from api.api_v1.models.types import Gender
+from api.api_v1.storage.database import Database
+from api.api_v1.storage.filters import AllOf, AnyOf, Condition, parse, tokenize
+
+
+class TestFilters(test.TestCase):
+    def test_tokenize(self):
+        assert tokenize("first_nameOrLast_NameANDemail") == (
+            "first_name",
+            "Or",
+            "last_name",
+            "AND",
+            "email",
+        )
+        assert tokenize("country_of_birth") == ("country_of_birth",)
+
+    def test_parse(self):
+        first_name, last_name = Condition("first_name"), Condition("last_name")
+        gender, email = Condition("gender"), Condition("email")
+        scenes = {
+            "first_name": AllOf((AnyOf((first_name,)),)),
+            "first_nameOrlast_name": AllOf((AnyOf((first_name, last_name)),)),
+            "first_nameANDlast_name": AllOf((AnyOf((first_name,)), AnyOf((last_name,)))),
+            "first_nameAndlast_nameAndgenderOremail": AllOf(
+                (AnyOf((first_name,)), AnyOf((last_name,)), AnyOf((gender, email)))
+            ),
+            "first_nameORlast_nameOrgenderANDemail": AllOf(
+                (AnyOf((first_name, last_name, gender)), AnyOf((email,)))
+            ),
+            # empty attributes are ignored
+            "first_nameAnd": AllOf((AnyOf((first_name,)),)),
+            "Orfirst_nameOr": AllOf((AnyOf((first_name,)),)),
+            "And": AllOf(()),
+        }
+        for expression, expected in scenes.items():
+            assert parse(expression) == expected
+        assert parse("email:eqOrdate_of_birth: GTE Andis_admin:") == AllOf(
+            (
+                AnyOf((Condition("email", "eq"), Condition("date_of_birth", "gte"))),
+                AnyOf((Condition("is_admin"),)),
+            )
+        )
+        assert parse("first_nameOrlast_nameAndemail").attributes() == (
+            "first_name",
+            "last_name",
+            "email",
+        )
+
+    def test_parse_cache(self):
+        parse.cache_clear()
+        plan = parse("first_nameOrlast_name")
+        assert parse("first_nameOrlast_name") is plan
+        assert parse.cache_info().hits == 1
+
+    def test_query_filter_builder_sql(self):
+        value = "john"
+        scenes = {
+            "first_nameOrlast_nameAndemail": [
+                Q(
+                    Q(first_name__icontains=value),
+                    Q(last_name__icontains=value),
+                    join_type=Q.OR,
+                ),
+                Q(email__icontains=value),
+            ],
+            "genderAndjob": [Q(gender__icontains=value), Q(job__icontains=value)],
+        }
+        for expression, expected in scenes.items():
+            query = Database.query_filter_builder(expression, value)
+            assert Person.filter(*query).sql() == Person.filter(*expected).sql()
+
+    def test_filter_value(self):
+        scenes = [
+            ("first_name", "contains", "jo", "jo"),
+            ("date_of_birth", "contains", "1970", "1970"),
+            ("gender", "startswith", "Male", "Male"),
+            ("is_admin", "startswith", "true", "true"),
+            ("email", "eq", "jo@x.com", "jo@x.com"),
+            ("email", "in", "Jo@X.com,al@x.com", ["jo@x.com", "al@x.com"]),
+            ("date_of_birth", "gte", "1990-01-31", date(1990, 1, 31)),
+            (
+                "date_of_birth",
+                "range",
+                "1990-01-01,2000-01-01",
+                [date(1990, 1, 1), date(2000, 1, 1)],
+            ),
+            ("gender", "in", "Male,Female", [Gender.MALE, Gender.FEMALE]),
+            ("is_admin", "eq", "True", True),
+            ("is_admin", "in", "0, no", [False, False]),
+        ]
+        for attribute, operator, value, expected in scenes:
+            actual = Database.filter_value(Person, attribute, operator, value)
+            assert actual == expected
+
+        invalid = [
+            ("date_of_birth", "gte", "notadate"),
+            ("date_of_birth", "range", "1990-01-01"),
+            ("gender", "eq", "Robot"),
+            ("is_admin", "eq", "maybe"),
+        ]
+        for attribute, operator, value in invalid:
+            with pytest.raises(ValueError):
+                Database.filter_value(Person, attribute, operator, value)
+
+    def test_query_filter_builder_operators(self):
+        query = Database.query_filter_builder(
+            "email:eqOrlast_name:startswithAnddate_of_birth:range",
+            "1990-01-01,2000-01-01",
+        )
+        sql = Person.filter(*query).sql()
+        assert "\"email\"='1990-01-01,2000-01-01'" in sql
+        assert (
+            "UPPER(CAST(\"last_name\" AS VARCHAR)) LIKE UPPER('1990-01-01,2000-01-01%')"
+            in sql
+        )
+        assert "\"date_of_birth\" BETWEEN '1990-01-01' AND '2000-01-01'" in sql
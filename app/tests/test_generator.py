@@ -0,0 +1,36 @@
+import json
+from collections import Counter
+from unittest import mock
+
+from email_validator import validate_email
+from tortoise.contrib import test
+
+from api.api_v1.models.pydantic import User
+from api.api_v1.storage.generator import generate_users, GENDERS
+
+
+class TestGenerator(test.TestCase):
+    def test_generate_users(self):
+        users = list(generate_users(2000, seed=7))
+        assert len(users) == 2000
+        # deterministic, any start keeps emails unique
+        assert users == list(generate_users(2000, seed=7))
+        assert users != list(generate_users(2000, seed=8))
+        assert list(generate_users(5, seed=7, start=10)) == list(
+            generate_users(5, seed=7, start=10)
+        )
+        emails = [user["email"] for user in users]
+        emails += [user["email"] for user in generate_users(2000, seed=7, start=2000)]
+        assert len(set(emails)) == len(emails)
+
+        # valid according to User class
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            for user in users:
+                assert json.loads(User.parse_obj(user).json()) == user
+        for email in emails[:100]:
+            validate_email(email, check_deliverability=False)
+
+        # same gender proportion as INIT_DATA
+        expected = Counter(GENDERS)["Female"] / len(GENDERS)
+        actual = Counter(user["gender"] for user in users)["Female"] / len(users)
+        assert abs(actual - expected) < 0.05
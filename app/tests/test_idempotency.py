@@ -0,0 +1,113 @@
+import asyncio
+import json
+from unittest import mock
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from tortoise.contrib import test
+
+from main import app
+from api.api_v1.models.tortoise import Person
+from api.api_v1.storage import idempotency
+from api.api_v1.storage.idempotency import (
+    IdempotencyStore,
+    MemoryIdempotencyStore,
+    use_store,
+)
+from api.api_v1.storage.initial_data import INIT_DATA
+
+BASE_URL = "http://127.0.0.1:8000"
+API_ROOT = "/api/v1/users/"
+
+
+class TestIdempotency(test.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.default_store = idempotency.store
+        self.store = MemoryIdempotencyStore(maxsize=10, ttl=60)
+        use_store(self.store)
+        self.validate_email = mock.patch("api.api_v1.models.pydantic.validate_email")
+        self.validate_email.start()
+
+    def tearDown(self):
+        self.validate_email.stop()
+        use_store(self.default_store)
+        super().tearDown()
+
+    async def post(self, user, key=None):
+        headers = {} if key is None else {"Idempotency-Key": key}
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            return await ac.post(API_ROOT, data=json.dumps(user), headers=headers)
+
+    async def test_replay(self):
+        first = await self.post(INIT_DATA[0], key="retry-1")
+        assert first.status_code == status.HTTP_201_CREATED
+        assert "Idempotent-Replayed" not in first.headers
+
+        # a retry replays the first response without touching the database
+        with mock.patch.object(Person, "create") as create:
+            replay = await self.post(INIT_DATA[0], key="retry-1")
+        create.assert_not_called()
+        assert replay.status_code == status.HTTP_201_CREATED
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert replay.json() == first.json() == {"id": first.json()["id"], **INIT_DATA[0]}
+        # same body as the first response, rendered through the response_model
+        assert replay.content == first.content
+        assert await Person.all().count() == 1
+
+        # same key, another body
+        response = await self.post(INIT_DATA[1], key="retry-1")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["success"] is False
+
+        # other keys and requests without key aren't deduplicated
+        assert (await self.post(INIT_DATA[0], key="retry-2")).status_code == 201
+        assert (await self.post(INIT_DATA[0])).status_code == 201
+        assert (await self.post(INIT_DATA[0])).status_code == 201
+        assert await Person.all().count() == 4
+
+        # expired or evicted key
+        self.store.cache.clear()
+        assert (await self.post(INIT_DATA[0], key="retry-1")).status_code == 201
+        assert await Person.all().count() == 5
+
+    async def test_in_flight(self):
+        create = Person.create
+
+        async def slow_create(**user):
+            await asyncio.sleep(0.05)
+            return await create(**user)
+
+        with mock.patch.object(Person, "create", side_effect=slow_create):
+            first, second = await asyncio.gather(
+                self.post(INIT_DATA[0], key="slow"), self.post(INIT_DATA[0], key="slow")
+            )
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_409_CONFLICT
+        assert idempotency._in_flight == set()
+
+        # failed requests aren't stored, the key can be retried
+        with mock.patch.object(Person, "create", side_effect=RuntimeError("down")):
+            with pytest.raises(RuntimeError):
+                await self.post(INIT_DATA[1], key="failed")
+        assert idempotency._in_flight == set()
+        assert (await self.post(INIT_DATA[1], key="failed")).status_code == 201
+
+    async def test_store(self):
+        class Incomplete(IdempotencyStore):
+            get = MemoryIdempotencyStore.get
+
+        # a backend missing an override fails when created
+        for store in (IdempotencyStore, Incomplete):
+            with pytest.raises(TypeError):
+                store()
+
+        shared = mock.AsyncMock(spec=IdempotencyStore)
+        shared.get.return_value = None
+        use_store(shared)
+        response = await self.post(INIT_DATA[0], key="shared")
+        assert response.status_code == status.HTTP_201_CREATED
+        [(key, (_, status_code, content))] = [call.args for call in shared.set.mock_calls]
+        assert key == "POST /api/v1/users shared"
+        assert (status_code, content) == (201, response.json())
@@ -1,7 +1,13 @@
 import json
+from datetime import date
 import concurrent.futures as futures
+from unittest import mock
+
+from email_validator import EmailUndeliverableError
 
 from fastapi import status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from httpx import AsyncClient
 from tortoise.contrib import test
 
@@ -9,8 +15,13 @@ from main import app
 from api.api_v1 import settings
 from api.utils import API_functools
 from api.api_v1.models.pydantic import User
-from api.api_v1.models.tortoise import Person
+from api.api_v1.models.tortoise import Person, Person_Pydantic, PERSON_FIELDS
+from api.api_v1.models.types import Gender
+from api.api_v1.storage.database import Database
 from api.api_v1.storage.initial_data import INIT_DATA
+from api.api_v1.storage.cache import response_cache
+from api.api_v1.storage.filters import OPERATORS
+from api.api_v1.storage.generator import generate_users
 
 TORTOISE_TEST_DB = getattr(settings, "TORTOISE_TEST_DB", "sqlite://:memory:")
 BASE_URL = "http://127.0.0.1:8000"
@@ -74,6 +85,7 @@ class TestPersonAPi(test.TestCase):
             "detail": "Welcome to FastAPI",
             "apis": ["/api/v1/users"],
             "fake_data": "/data",
+            "stats": "/stats",
             "docs": ["/docs", "/redoc"],
             "openapi": "/openapi.json",
         }
@@ -91,6 +103,9 @@ class TestPersonAPi(test.TestCase):
         # load fake data
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
             response = await ac.get("/data", params={"quantity": quantity_users})
+        [redirect] = response.history
+        assert redirect.headers["X-Rows"] == str(quantity_users)
+        assert int(redirect.headers["X-Rows-Per-Second"]) > 0
 
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
             response = await ac.get(API_ROOT)
@@ -105,6 +120,21 @@ class TestPersonAPi(test.TestCase):
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == expected
 
+        # synthetic users, numbered after the stored ones
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get("/data", params={"quantity": 50, "seed": 3})
+        assert response.history[0].headers["X-Rows"] == "50"
+        assert await Person.filter(id__gt=quantity_users).order_by("id").values(
+            *User.attributes()
+        ) == [
+            {
+                **user,
+                "gender": Gender(user["gender"]),
+                "date_of_birth": date.fromisoformat(user["date_of_birth"]),
+            }
+            for user in generate_users(50, seed=3, start=quantity_users)
+        ]
+
     async def test_get_users(self):
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
             response = await ac.get(API_ROOT)
@@ -181,6 +211,46 @@ class TestPersonAPi(test.TestCase):
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert response.json() == expected
 
+    async def test_count_strategies(self):
+        limit = 2
+        users = INIT_DATA[:3]
+        for user in users:
+            await Person.create(**user)
+
+        for count in ("exact", "cached", "estimated"):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.get(API_ROOT, params={"limit": limit, "count": count})
+            assert response.status_code == status.HTTP_200_OK
+            assert response.headers["X-Total-Count"] == str(len(users))
+            next_page = f"{API_ROOT}?limit={limit}&offset={limit}&count={count}"
+            assert response.json()["next"] == next_page
+
+        # total isn't computed, links still work
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            params = {"limit": limit, "include_total": False}
+            response = await ac.get(API_ROOT, params=params)
+            assert "X-Total-Count" not in response.headers
+            next_page = f"{API_ROOT}?limit={limit}&offset={limit}&include_total=false"
+            assert response.json()["next"] == next_page
+            response = await ac.get(next_page)
+        assert "X-Total-Count" not in response.headers
+        assert response.json() == {
+            "next": None,
+            "previous": f"{API_ROOT}?limit={limit}&offset=0&include_total=false",
+            "users": [{"id": 3, **users[2]}],
+        }
+
+        # Invalid count strategy
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get(API_ROOT, params={"count": "approximate"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "success": False,
+            "users": [],
+            "detail": "Invalid count strategy. \
+Try with: ('exact', 'cached', 'estimated')",
+        }
+
     async def test_sorted_by_attribute(self):
         # sort by first_name ascending order
         asc = "first_name:asc"
@@ -278,6 +348,19 @@ class TestPersonAPi(test.TestCase):
         assert response.status_code == status.HTTP_202_ACCEPTED
         assert response.json() == user_expected
 
+    async def test_fix_user_sent_attributes(self):
+        person = await Person.create(**USER_DATA2)
+        data = {"first_name": "Johnny", "last_name": "Doe", "email": "johnny@doe.fr"}
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch.object(
+            Person, "get_or_none"
+        ) as get_or_none:
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.patch(f"{API_ROOT}{person.id}", data=json.dumps(data))
+        # single UPDATE ... RETURNING, optional attributes not sent are kept
+        get_or_none.assert_not_called()
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json() == {"id": person.id, **USER_DATA2, **data}
+
     async def test_put_user(self):
 
         # test user doesn't exist
@@ -347,6 +430,9 @@ class TestPersonAPi(test.TestCase):
 
         # Invalid attribute
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for url in ("password/a", "first_nameOrpassword/a", "And/a"):
+                response = await ac.get(f"{API_ROOT}filter/{url}")
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
             response = await ac.get(f"{API_ROOT}filter/id/{person.id}")
         expected = {
             "success": False,
@@ -364,7 +450,12 @@ class TestPersonAPi(test.TestCase):
             response = await ac.get(
                 f"{API_ROOT}filter/first_name/{person.first_name[:4].lower()}"
             )
-        expected = {"success": True, "users": [{"id": person.id, **USER_DATA}]}
+        expected = {
+            "success": True,
+            "next": None,
+            "previous": None,
+            "users": [{"id": person.id, **USER_DATA}],
+        }
 
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == expected
@@ -374,7 +465,12 @@ class TestPersonAPi(test.TestCase):
         # Test with keyword "Or"
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
             response = await ac.get(API_ROOT + url + "john")
-        expected = {"success": True, "users": [{"id": person.id, **USER_DATA}]}
+        expected = {
+            "success": True,
+            "next": None,
+            "previous": None,
+            "users": [{"id": person.id, **USER_DATA}],
+        }
 
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == expected
@@ -384,7 +480,12 @@ class TestPersonAPi(test.TestCase):
         # Test with keyword "Or"
         async with AsyncClient(app=app, base_url=BASE_URL) as ac:
             response = await ac.get(API_ROOT + url + "john")
-        expected = {"success": True, "users": [{"id": person.id, **USER_DATA}]}
+        expected = {
+            "success": True,
+            "next": None,
+            "previous": None,
+            "users": [{"id": person.id, **USER_DATA}],
+        }
 
         assert response.status_code == status.HTTP_200_OK
         assert response.json() == expected
@@ -396,6 +497,8 @@ class TestPersonAPi(test.TestCase):
             response = await ac.get(API_ROOT + url + "bob")
         expected = {
             "success": True,
+            "next": None,
+            "previous": None,
             "users": [
                 {"id": person2.id, **USER_DATA_WITH_SAME_NAME},
             ],
@@ -443,3 +546,715 @@ class TestPersonAPi(test.TestCase):
         assert response.status_code == status.HTTP_202_ACCEPTED
         assert response.json() == expected
         assert None is deleted_user
+
+    async def test_cursor_pagination(self):
+        limit = 3
+        users = [
+            {**user, "job": None} if n % 4 == 0 else user
+            for n, user in enumerate(INIT_DATA[:10])
+        ]
+        for user in users:
+            await Person.create(**user)
+        expected_users = [{"id": n, **user} for n, user in enumerate(users, start=1)]
+
+        for sort in ("id:asc", "first_name:desc", "job:asc", "date_of_birth:desc"):
+            attr, order = sort.split(":")
+            expected = sorted(
+                expected_users,
+                key=lambda u: ((u[attr] is not None, u[attr] or ""), u["id"]),
+                reverse=order == "desc",
+            )
+            pages = []
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.get(
+                    API_ROOT, params={"limit": limit, "sort": sort, "cursor": ""}
+                )
+                assert response.json()["previous"] is None
+                pages.append(response.json())
+                while pages[-1]["next"] is not None:
+                    response = await ac.get(pages[-1]["next"])
+                    assert response.status_code == status.HTTP_200_OK
+                    pages.append(response.json())
+            actual = [user for page in pages for user in page["users"]]
+            assert actual == expected
+            assert [len(page["users"]) for page in pages] == [3, 3, 3, 1]
+
+            # go back to the first page
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                for page in reversed(pages[:-1]):
+                    response = await ac.get(pages[-1]["previous"])
+                    assert response.status_code == status.HTTP_200_OK
+                    assert response.json()["users"] == page["users"]
+                    pages[-1] = response.json()
+            assert pages[-1]["previous"] is None
+
+        # Invalid cursors
+        bad_value = API_functools.encode_cursor(
+            "date_of_birth", {"id": 1, "date_of_birth": "unknown"}
+        )
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for cursor in ("invalid", bad_value):
+                response = await ac.get(API_ROOT, params={"cursor": cursor})
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+                assert response.json() == {
+                    "success": False,
+                    "users": [],
+                    "detail": "Invalid cursor",
+                }
+
+        # Not found
+        after_last = API_functools.encode_cursor("id", {"id": 10})
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get(API_ROOT, params={"cursor": after_last})
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json() == {"success": False, "users": [], "detail": "Not Found"}
+
+    async def test_response_cache(self):
+        response_cache.ttl = 30
+        person = await Person.create(**USER_DATA)
+        urls = [API_ROOT, f"{API_ROOT}{person.id}", f"{API_ROOT}filter/last_name/o"]
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            expected = [(await ac.get(url)).json() for url in urls]
+
+        # rows changed without the API are served from cache
+        person2 = await Person.create(**USER_DATA_WITH_SAME_NAME)
+        await Person.filter(id=person.id).update(last_name="Bob")
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            assert [(await ac.get(url)).json() for url in urls] == expected
+            response = await ac.get(API_ROOT)
+        assert response.headers["X-Total-Count"] == "1"
+
+        # any write through the API invalidates the cache
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            await ac.delete(f"{API_ROOT}{person2.id}")
+            actual = [(await ac.get(url)).json() for url in urls]
+        user = {"id": person.id, **USER_DATA, "last_name": "Bob"}
+        assert actual == [
+            {"next": None, "previous": None, "users": [user]},
+            {"success": True, "user": user},
+            {"success": True, "next": None, "previous": None, "users": [user]},
+        ]
+
+    async def test_projection_same_bytes(self):
+        for user in INIT_DATA[:5]:
+            await Person.create(**user)
+        # previous serialization: Person_Pydantic models + jsonable_encoder
+        users = await Person_Pydantic.from_queryset(Person.all().order_by("id"))
+        query = Database.query_filter_builder("first_nameOrlast_name", "a")
+        persons = await Person_Pydantic.from_queryset(
+            Person.filter(*query).order_by("id")
+        )
+        expected = [
+            {"next": None, "previous": None, "users": users},
+            {"success": True, "next": None, "previous": None, "users": persons},
+        ]
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            responses = [
+                await ac.get(API_ROOT),
+                await ac.get(f"{API_ROOT}filter/first_nameOrlast_name/a"),
+            ]
+        for response, content in zip(responses, expected):
+            assert response.content == JSONResponse(jsonable_encoder(content)).body
+
+    async def test_sparse_fieldsets(self):
+        users = INIT_DATA[:3]
+        for user in users:
+            await Person.create(**user)
+        fields = "first_name,last_name,avatar"
+        expected = [
+            {
+                "id": n,
+                "first_name": u["first_name"],
+                "last_name": u["last_name"],
+                "avatar": u["avatar"],
+            }
+            for n, u in enumerate(users, start=1)
+        ]
+
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get(API_ROOT, params={"fields": fields, "limit": 2})
+            assert response.json()["users"] == expected[:2]
+            next_page = (
+                f"{API_ROOT}?limit=2&offset=2&fields=first_name%2Clast_name%2Cavatar"
+            )
+            assert response.json()["next"] == next_page
+            response = await ac.get(next_page)
+            assert response.json()["users"] == expected[2:]
+
+            # the sort attribute isn't returned by cursor pages either
+            params = {"fields": fields, "limit": 2, "cursor": "", "sort": "email:desc"}
+            response = await ac.get(API_ROOT, params=params)
+            actual = response.json()["users"]
+            response = await ac.get(response.json()["next"])
+            actual += response.json()["users"]
+            by_email = sorted(
+                zip(users, expected), key=lambda u: u[0]["email"], reverse=True
+            )
+            assert actual == [user for _, user in by_email]
+
+            response = await ac.get(f"{API_ROOT}2", params={"fields": "email"})
+            assert response.json() == {
+                "success": True,
+                "user": {"id": 2, "email": users[1]["email"]},
+            }
+
+            url = f"{API_ROOT}filter/first_name/{users[0]['first_name']}"
+            response = await ac.get(url, params={"fields": fields})
+            assert response.json() == {
+                "success": True,
+                "next": None,
+                "previous": None,
+                "users": expected[:1],
+            }
+
+        # Invalid fields
+        detail = f"Invalid fields. Try with: {('id',) + User.attributes()}"
+        urls = [API_ROOT, f"{API_ROOT}1", f"{API_ROOT}filter/first_name/a"]
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for url, key in zip(urls, ("users", "user", "users")):
+                response = await ac.get(url, params={"fields": "first_name,password"})
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+                assert response.json() == {
+                    "success": False,
+                    key: [] if key == "users" else {},
+                    "detail": detail,
+                }
+
+    async def test_export_users(self):
+        users = INIT_DATA[:5]
+        for user in users:
+            await Person.create(**user)
+        url = f"{API_ROOT}export"
+        by_email = sorted(
+            enumerate(users, start=1), key=lambda u: u[1]["email"], reverse=True
+        )
+
+        # chunks smaller than the table are streamed one after the other
+        with mock.patch("api.api_v1.endpoints.persons.EXPORT_CHUNK_SIZE", 2):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.get(url)
+                assert response.status_code == status.HTTP_200_OK
+                assert response.headers["content-type"] == "application/x-ndjson"
+                assert response.headers["content-disposition"] == (
+                    "attachment; filename=users.ndjson"
+                )
+                actual = [json.loads(line) for line in response.text.splitlines()]
+                expected = [
+                    jsonable_encoder(Person_Pydantic(id=n, **u))
+                    for n, u in enumerate(users, start=1)
+                ]
+                assert actual == expected
+
+                params = {"sort": "email:desc", "fields": "email,gender"}
+                response = await ac.get(url, params=params)
+                actual = [json.loads(line) for line in response.text.splitlines()]
+                assert actual == [
+                    {"id": n, "email": u["email"], "gender": u["gender"]}
+                    for n, u in by_email
+                ]
+
+                params = {"format": "csv", "sort": "email:desc", "fields": "email,gender"}
+                response = await ac.get(url, params=params)
+                assert response.headers["content-type"].startswith("text/csv")
+                assert response.text.splitlines() == ["id,email,gender"] + [
+                    f"{n},{u['email']},{u['gender']}" for n, u in by_email
+                ]
+
+                params = {
+                    "sort": "email:asc",
+                    "fields": "first_name",
+                    "user_attribute": "first_name",
+                    "value": users[2]["first_name"],
+                }
+                response = await ac.get(url, params=params)
+                assert [json.loads(line) for line in response.text.splitlines()] == [
+                    {"id": 3, "first_name": users[2]["first_name"]}
+                ]
+
+        # Invalid parameters
+        invalid = {
+            "Invalid format. Try with: ('ndjson', 'csv')": {"format": "xml"},
+            "Invalid sort parameters. it must match \
+            attribute:order. ex: id:asc or id:desc": {
+                "sort": "password:asc"
+            },
+            f"Invalid fields. Try with: {('id',) + User.attributes()}": {
+                "fields": "password"
+            },
+            f"""
+            Invalid attribute filter.
+            Try with: {User.attributes()}
+            """: {
+                "user_attribute": "salary",
+                "value": "a",
+            },
+        }
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for detail, params in invalid.items():
+                response = await ac.get(url, params=params)
+                assert response.status_code == status.HTTP_400_BAD_REQUEST
+                assert response.json() == {
+                    "success": False,
+                    "users": [],
+                    "detail": detail,
+                }
+
+    async def test_filter_pagination(self):
+        users = INIT_DATA[:10]
+        for user in users:
+            await Person.create(**user)
+        url = f"{API_ROOT}filter/first_nameOrlast_name/a"
+        matching = [
+            {"id": n, **user}
+            for n, user in enumerate(users, start=1)
+            if "a" in user["first_name"].lower() or "a" in user["last_name"].lower()
+        ]
+        assert len(matching) > 3
+        limit = 3
+
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.get(url, params={"limit": limit})
+            assert response.status_code == status.HTTP_200_OK
+            assert response.json() == {
+                "success": True,
+                "next": f"{url}?limit={limit}&offset={limit}",
+                "previous": None,
+                "users": matching[:limit],
+            }
+            actual, page = [], response.json()
+            while page["next"] is not None:
+                actual += page["users"]
+                page = (await ac.get(page["next"])).json()
+            actual += page["users"]
+            assert actual == matching
+            assert page["previous"] is not None
+
+            # sorted and cursor pages
+            params = {"limit": limit, "sort": "email:desc", "cursor": ""}
+            page = (await ac.get(url, params=params)).json()
+            actual = page["users"]
+            while page["next"] is not None:
+                page = (await ac.get(page["next"])).json()
+                actual += page["users"]
+            assert page["success"] is True
+            assert actual == sorted(matching, key=lambda u: u["email"], reverse=True)
+
+        # Invalid parameters
+        invalid = {
+            "Invalid values: offset(>=0) or limit(>0)": {"limit": 0},
+            "Invalid sort parameters. it must match \
+            attribute:order. ex: id:asc or id:desc": {
+                "sort": "password:asc"
+            },
+            "Invalid cursor": {"cursor": "notacursor"},
+        }
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for detail, params in invalid.items():
+                for target in (url, API_ROOT):
+                    response = await ac.get(target, params=params)
+                    assert response.status_code == status.HTTP_400_BAD_REQUEST
+                    assert response.json() == {
+                        "success": False,
+                        "users": [],
+                        "detail": detail,
+                    }
+
+            # the maximum page size only applies to the filter endpoint
+            params = {"limit": settings.MAX_PAGE_SIZE + 1}
+            response = await ac.get(url, params=params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json()["detail"] == (
+                f"Invalid limit. Maximum page size is {settings.MAX_PAGE_SIZE}"
+            )
+            response = await ac.get(API_ROOT, params=params)
+            assert response.status_code == status.HTTP_200_OK
+
+    async def test_filter_operators(self):
+        users = INIT_DATA[:10]
+        for user in users:
+            await Person.create(**user)
+        expected = [{"id": n, **user} for n, user in enumerate(users, start=1)]
+
+        def ids(*conditions):
+            return [user for user in expected if all(c(user) for c in conditions)]
+
+        scenes = {
+            f"email:eq/{users[3]['email']}": ids(lambda u: u["id"] == 4),
+            # emails are stored lowercased
+            f"email:eq/{users[3]['email'].upper()}": ids(lambda u: u["id"] == 4),
+            # exact match only
+            f"email:eq/{users[3]['email'][:5]}": [],
+            "last_name:startswith/gl": ids(lambda u: u["last_name"] == "Glencorse"),
+            "gender:in/Male": ids(lambda u: u["gender"] == "Male"),
+            # text comparison of non text columns
+            "gender:startswith/male": ids(lambda u: u["gender"] == "Male"),
+            f"date_of_birth:startswith/{users[0]['date_of_birth'][:4]}": ids(
+                lambda u: u["date_of_birth"][:4] == users[0]["date_of_birth"][:4]
+            ),
+            "is_admin:eq/true": ids(lambda u: u["is_admin"]),
+            "date_of_birth:gte/1990-01-01": ids(lambda u: u["date_of_birth"] >= "1990"),
+            "date_of_birth:range/1980-01-01,1989-12-31": ids(
+                lambda u: "1980" <= u["date_of_birth"] < "1990"
+            ),
+            "first_name:startswithOrlast_name:startswith/h": ids(
+                lambda u: u["first_name"][0] in "hH" or u["last_name"][0] in "hH"
+            ),
+        }
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for url, users_found in scenes.items():
+                response = await ac.get(f"{API_ROOT}filter/{url}")
+                if users_found:
+                    assert response.status_code == status.HTTP_200_OK
+                    assert response.json()["users"] == users_found
+                else:
+                    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # Invalid operator or value
+        invalid = {
+            "email:like/a": f"Invalid filter operator. Try with: {OPERATORS}",
+            "date_of_birth:gte/notadate": "Invalid filter value",
+            "date_of_birth:range/1990-01-01": "Invalid filter value",
+            "gender:in/Male,Robot": "Invalid filter value",
+            "is_admin:eq/maybe": "Invalid filter value",
+        }
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            for url, detail in invalid.items():
+                attribute, value = url.split("/")
+                responses = [
+                    await ac.get(f"{API_ROOT}filter/{url}"),
+                    await ac.get(
+                        f"{API_ROOT}export",
+                        params={"user_attribute": attribute, "value": value},
+                    ),
+                ]
+                for response in responses:
+                    assert response.status_code == status.HTTP_400_BAD_REQUEST
+                    assert response.json() == {
+                        "success": False,
+                        "users": [],
+                        "detail": detail,
+                    }
+
+    async def test_bulk_create_users(self):
+        stored = await Person.create(**USER_DATA)
+        users = [*INIT_DATA[:5], {**INIT_DATA[5], "first_name": "Al"}]
+        users += [
+            {**INIT_DATA[6], "email": USER_DATA["email"].upper()},
+            {**INIT_DATA[7], "email": INIT_DATA[0]["email"]},
+            {**INIT_DATA[8], "gender": "Robot"},
+            INIT_DATA[9],
+        ]
+        created = [0, 1, 2, 3, 4, 9]
+
+        # email deliverability isn't checked (no DNS in tests)
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch(
+            "api.api_v1.endpoints.persons.BULK_CHUNK_SIZE", 2
+        ):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.post(f"{API_ROOT}bulk", data=json.dumps(users))
+        assert response.status_code == status.HTTP_201_CREATED
+        content = response.json()
+        assert content["success"] is False
+        assert content["created"] == len(created)
+        results = content["results"]
+        assert [r["index"] for r in results] == list(range(len(users)))
+        assert [n for n, r in enumerate(results) if r["success"]] == created
+
+        expected = [
+            {"id": stored.id + n, **users[index]}
+            for n, index in enumerate(created, start=1)
+        ]
+        assert [results[index]["user"] for index in created] == expected
+        assert await Person.filter(id__gt=stored.id).order_by("id").values(
+            *PERSON_FIELDS
+        ) == [
+            {
+                **user,
+                "gender": Gender(user["gender"]),
+                "date_of_birth": date.fromisoformat(user["date_of_birth"]),
+            }
+            for user in expected
+        ]
+
+        errors = {index: results[index]["detail"][0] for index in (5, 6, 7, 8)}
+        assert errors[5]["loc"] == ["first_name"]
+        assert errors[6]["msg"] == errors[7]["msg"] == "email already exists."
+        assert errors[8]["loc"] == ["gender"]
+
+        # nothing valid to create
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            response = await ac.post(f"{API_ROOT}bulk", data=json.dumps(users[8:9]))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["created"] == 0
+
+        # too many users
+        with mock.patch("api.api_v1.endpoints.persons.BULK_MAX_ITEMS", 2):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.post(f"{API_ROOT}bulk", data=json.dumps(users[:3]))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json() == {
+            "success": False,
+            "results": [],
+            "detail": "Too many users. Maximum is 2",
+        }
+
+    async def test_bulk_patch_users(self):
+        users = [await Person.create(**user) for user in INIT_DATA[:3]]
+        fix = {"first_name": "Johnny", "last_name": "Bulk", "job": "Tester"}
+        payload = [
+            # sent null: written
+            {**fix, "id": users[0].id, "email": INIT_DATA[0]["email"], "avatar": None},
+            {
+                **fix,
+                "id": users[1].id,
+                "email": INIT_DATA[1]["email"],
+                "company": "First",
+            },
+            {**fix, "id": 999, "email": INIT_DATA[2]["email"]},
+            # the last data of a repeated ID is kept
+            {
+                **fix,
+                "id": users[1].id,
+                "email": INIT_DATA[1]["email"],
+                "company": "Second",
+            },
+            # invalid users are reported, the others are updated
+            {**fix, "id": users[2].id, "email": INIT_DATA[2]["email"], "job": "QA"},
+            {**fix, "id": "third", "email": INIT_DATA[2]["email"]},
+        ]
+
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch(
+            "api.api_v1.endpoints.persons.BULK_CHUNK_SIZE", 2
+        ):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.patch(f"{API_ROOT}bulk", data=json.dumps(payload))
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        content = response.json()
+        assert content["updated"] == [users[0].id, users[1].id]
+        assert content["missing"] == [999]
+        assert content["success"] is False
+        assert [error["index"] for error in content["errors"]] == [4, 5]
+        assert content["errors"][0]["detail"][0]["loc"] == ["job"]
+        assert content["errors"][1]["detail"][0]["loc"] == ["id"]
+        expected = [
+            # only the attributes sent are written, as PATCH /users/{user_ID}
+            {**INIT_DATA[0], **fix, "avatar": None},
+            {**INIT_DATA[1], **fix, "company": "Second"},
+            INIT_DATA[2],
+        ]
+        actual = await Person.all().order_by("id").values(*User.attributes())
+        assert actual == [
+            {
+                **user,
+                "gender": Gender(user["gender"]),
+                "date_of_birth": date.fromisoformat(user["date_of_birth"]),
+            }
+            for user in expected
+        ]
+
+        # nothing to update
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.patch(
+                    f"{API_ROOT}bulk", data=json.dumps(payload[2:3])
+                )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.json() == {
+            "success": False,
+            "updated": [],
+            "missing": [999],
+            "errors": [],
+        }
+
+        # nothing valid
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.patch(
+                    f"{API_ROOT}bulk", data=json.dumps(payload[4:] + [{}])
+                )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        content = response.json()
+        assert content["updated"] == content["missing"] == []
+        assert [error["index"] for error in content["errors"]] == [0, 1, 2]
+
+        # too many users
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch(
+            "api.api_v1.endpoints.persons.BULK_MAX_ITEMS", 1
+        ):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.patch(f"{API_ROOT}bulk", data=json.dumps(payload))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Too many users. Maximum is 1"
+
+    async def test_bulk_delete_users(self):
+        users = [await Person.create(**user) for user in INIT_DATA[:4]]
+        ids = [users[0].id, 999, users[2].id, users[3].id, users[0].id]
+
+        with mock.patch("api.api_v1.endpoints.persons.BULK_CHUNK_SIZE", 2):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.delete(
+                    f"{API_ROOT}bulk", params={"ids": ",".join(map(str, ids))}
+                )
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.json() == {
+            "success": False,
+            "deleted": [users[0].id, users[2].id, users[3].id],
+            "missing": [999],
+        }
+        assert await Person.all().values_list("id", flat=True) == [users[1].id]
+
+        scenes = {
+            "999": (status.HTTP_404_NOT_FOUND, "missing"),
+            "1,a": (status.HTTP_400_BAD_REQUEST, "detail"),
+            f"{users[1].id},999": (status.HTTP_400_BAD_REQUEST, "detail"),
+        }
+        with mock.patch("api.api_v1.endpoints.persons.BULK_MAX_ITEMS", 1):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                for ids, (code, key) in scenes.items():
+                    response = await ac.delete(f"{API_ROOT}bulk", params={"ids": ids})
+                    assert response.status_code == code
+                    assert key in response.json()
+        assert await Person.all().count() == 1
+
+    async def test_upsert_user(self):
+        # conflict target: unique LOWER(email) index (rolled back with the test)
+        for sql in Database.indexes_sql(Person):
+            await Person._meta.db.execute_query(sql)
+        email = USER_DATA["email"]
+
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                created = await ac.put(
+                    f"{API_ROOT}by-email/{email}", data=json.dumps(USER_DATA)
+                )
+                # same email, other case: the stored user is updated
+                data = {**USER_DATA, "email": email.upper(), "job": "Data Engineer"}
+                updated = await ac.put(
+                    f"{API_ROOT}by-email/{email.upper()}", data=json.dumps(data)
+                )
+                mismatch = await ac.put(
+                    f"{API_ROOT}by-email/other@doe.fr", data=json.dumps(USER_DATA)
+                )
+        assert created.status_code == updated.status_code == status.HTTP_200_OK
+        user_ID = created.json()["user"]["id"]
+        assert created.json() == {"success": True, "user": {"id": user_ID, **USER_DATA}}
+        assert updated.json() == {
+            "success": True,
+            "user": {"id": user_ID, **USER_DATA, "job": "Data Engineer"},
+        }
+        assert await Person.all().values_list("id", "job") == [(user_ID, "Data Engineer")]
+        assert mismatch.status_code == status.HTTP_400_BAD_REQUEST
+        assert mismatch.json()["success"] is False
+
+    async def test_upsert_users(self):
+        for sql in Database.indexes_sql(Person):
+            await Person._meta.db.execute_query(sql)
+        stored = await Person.create(**INIT_DATA[0])
+        users = [
+            {**INIT_DATA[0], "job": "Data Engineer"},
+            INIT_DATA[1],
+            {**INIT_DATA[2], "gender": "Robot"},
+            {**INIT_DATA[3], "job": "First"},
+            INIT_DATA[4],
+            # the last user of a repeated email is kept
+            {**INIT_DATA[3], "email": INIT_DATA[3]["email"].upper(), "job": "Last"},
+        ]
+
+        db = Person._meta.db
+        execute_query = db.execute_query
+
+        async def reversed_returning(query, values):
+            count, rows = await execute_query(query, values)
+            return count, rows[::-1]
+
+        # RETURNING rows in another order: IDs still match their users
+        with mock.patch("api.api_v1.models.pydantic.validate_email"), mock.patch(
+            "api.api_v1.endpoints.persons.BULK_CHUNK_SIZE", 2
+        ), mock.patch.object(db, "execute_query", side_effect=reversed_returning):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                response = await ac.put(f"{API_ROOT}by-email", data=json.dumps(users))
+        assert response.status_code == status.HTTP_200_OK
+        content = response.json()
+        assert content["success"] is False
+        assert content["upserted"] == 4
+        results = content["results"]
+        assert [r["success"] for r in results] == [True, True, False, False, True, True]
+        assert results[0]["user"] == {"id": stored.id, **users[0]}
+        emails = dict(await Person.all().values_list("id", "email"))
+        for result in results:
+            if result["success"]:
+                assert emails[result["user"]["id"]] == result["user"]["email"]
+        assert results[2]["detail"][0]["loc"] == ["gender"]
+        assert results[3]["detail"][0]["type"] == "value_error.duplicate"
+        assert results[5]["user"]["email"] == INIT_DATA[3]["email"]
+
+        stored = await Person.all().order_by("id").values_list("email", "job")
+        assert stored == [
+            (INIT_DATA[0]["email"], "Data Engineer"),
+            (INIT_DATA[1]["email"], INIT_DATA[1]["job"]),
+            (INIT_DATA[4]["email"], INIT_DATA[4]["job"]),
+            (INIT_DATA[3]["email"], "Last"),
+        ]
+
+        async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+            # nothing valid
+            response = await ac.put(f"{API_ROOT}by-email", data=json.dumps(users[2:3]))
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert response.json()["upserted"] == 0
+            with mock.patch("api.api_v1.endpoints.persons.BULK_MAX_ITEMS", 1):
+                response = await ac.put(f"{API_ROOT}by-email", data=json.dumps(users))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.json()["detail"] == "Too many users. Maximum is 1"
+
+    async def test_undeliverable_email(self):
+        def validate(email, check_deliverability=True):
+            if check_deliverability and email.lower().endswith("@nowhere.test"):
+                raise EmailUndeliverableError(
+                    "The domain name nowhere.test does not exist."
+                )
+
+        # upsert conflict target
+        for sql in Database.indexes_sql(Person):
+            await Person._meta.db.execute_query(sql)
+        person = await Person.create(**USER_DATA2)
+        user = {**USER_DATA, "email": "john@nowhere.test"}
+        with mock.patch(
+            "api.api_v1.models.pydantic.validate_email", side_effect=validate
+        ):
+            async with AsyncClient(app=app, base_url=BASE_URL) as ac:
+                responses = [
+                    await ac.post(API_ROOT, data=json.dumps(user)),
+                    await ac.put(f"{API_ROOT}{person.id}", data=json.dumps(user)),
+                    await ac.patch(f"{API_ROOT}{person.id}", data=json.dumps(user)),
+                    await ac.put(
+                        f"{API_ROOT}by-email/{user['email']}", data=json.dumps(user)
+                    ),
+                ]
+                for response in responses:
+                    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+                    assert response.json()["detail"] == [
+                        {
+                            "loc": ["body", "email"],
+                            "msg": "email is not a valid email address.",
+                            "type": "value_error",
+                        }
+                    ]
+
+                users = [USER_DATA2, user]
+                response = await ac.patch(
+                    f"{API_ROOT}bulk",
+                    data=json.dumps([{**u, "id": person.id} for u in users]),
+                )
+                assert response.status_code == status.HTTP_202_ACCEPTED
+                errors = response.json()["errors"]
+                assert [error["index"] for error in errors] == [1]
+                assert errors[0]["detail"][0]["loc"] == ["email"]
+                users = [USER_DATA, user]
+                for method, url in (("POST", "bulk"), ("PUT", "by-email")):
+                    response = await ac.request(
+                        method, f"{API_ROOT}{url}", data=json.dumps(users)
+                    )
+                    results = response.json()["results"]
+                    assert [r["success"] for r in results] == [True, False]
+                    assert results[1]["detail"][0]["loc"] == ["email"]
+        assert await Person.filter(email__icontains="nowhere").count() == 0
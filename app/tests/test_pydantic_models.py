@@ -1,10 +1,27 @@
+import time
+import threading
+from datetime import date
+from unittest import mock
+
 import pytest
 
-from pydantic import BaseConfig, Field
+from email_validator import EmailUndeliverableError
+from pydantic import BaseConfig, Field, ValidationError
 from pydantic.fields import ModelField
 from tortoise.contrib import test
 
-from api.api_v1.models.pydantic import User, PartialUser
+from api.api_v1.storage.initial_data import INIT_DATA
+from api.api_v1.models.types import Gender
+from api.api_v1.models.pydantic import (
+    EMAIL_PATTERN,
+    URL_PATTERN,
+    User,
+    PartialUser,
+    PartialUserWithID,
+    email_error,
+    deliverability_cache,
+    undeliverable_emails,
+)
 
 url_regex = r"(https?:\/\/(www\.)?|(www\.))([\w\-\_\.]+)(\.[a-z]{2,10})(\/[^\s,%]+)?"
 
@@ -97,3 +114,166 @@ class TestPydantic(test.TestCase):
         good_email_format = ["contact@eliam-lotonga.fr", "johndoe@gmail.com"]
         for email in good_email_format:
             assert PartialUser.valid_email(email, field=field) == email
+
+    def test_email_error_cache(self):
+        with mock.patch(
+            "api.api_v1.models.pydantic.validate_email", wraps=lambda email, **kw: None
+        ) as validate:
+            for _ in range(3):
+                assert email_error("john@doe.fr") is None
+        # one call per email
+        assert validate.call_count == 1
+        assert email_error("johndoe.com") is not None
+        assert email_error.cache_info().maxsize > 0
+
+    async def test_undeliverable_emails(self):
+        threads = set()
+
+        def validate(email, check_deliverability=True):
+            threads.add(threading.current_thread().name)
+            if check_deliverability and email.endswith("@nowhere.test"):
+                raise EmailUndeliverableError(
+                    "The domain name nowhere.test does not exist."
+                )
+
+        emails = ["a@doe.fr", "b@nowhere.test", "b@nowhere.test"]
+        with mock.patch(
+            "api.api_v1.models.pydantic.validate_email", side_effect=validate
+        ):
+            assert await undeliverable_emails(emails) == {
+                "b@nowhere.test": "The domain name nowhere.test does not exist."
+            }
+            # DNS lookups don't run on the event loop thread
+            assert threads and all(name.startswith("email-dns") for name in threads)
+
+            # offline: syntax only
+            with mock.patch("api.api_v1.models.pydantic.EMAIL_OFFLINE", True):
+                assert await undeliverable_emails(["c@nowhere.test"]) == {}
+
+    async def test_undeliverable_emails_cache(self):
+        lookups = []
+        failing = {"c@down.test"}
+
+        def validate(email, check_deliverability=True):
+            lookups.append(email)
+            if email.endswith("@nowhere.test"):
+                raise EmailUndeliverableError(
+                    "The domain name nowhere.test does not exist."
+                )
+            if email in failing:
+                raise EmailUndeliverableError(
+                    "There was an error while checking if the domain name in "
+                    "the email address is deliverable: SERVFAIL"
+                )
+            # no MX record: the lookup timed out
+            return mock.Mock(mx=None if email.endswith("@slow.test") else [(0, "mx")])
+
+        emails = ["a@doe.fr", "b@nowhere.test", "c@down.test", "d@slow.test"]
+        with mock.patch(
+            "api.api_v1.models.pydantic.validate_email", side_effect=validate
+        ):
+            errors = await undeliverable_emails(emails)
+            assert sorted(errors) == ["b@nowhere.test", "c@down.test"]
+            failing.clear()
+            # resolver errors and timeouts are checked again, the others are cached
+            assert await undeliverable_emails(emails) == {
+                "b@nowhere.test": "The domain name nowhere.test does not exist."
+            }
+            assert sorted(lookups) == sorted(emails + ["c@down.test", "d@slow.test"])
+            assert set(deliverability_cache._data) == set(emails[:3])
+
+            # results expire
+            with mock.patch.object(deliverability_cache, "ttl", 0.01):
+                deliverability_cache.clear()
+                await undeliverable_emails(emails[:1])
+                time.sleep(0.02)
+                await undeliverable_emails(emails[:1])
+            assert lookups[-2:] == ["a@doe.fr", "a@doe.fr"]
+
+    def test_trusted(self):
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            users = [User.parse_obj(user) for user in INIT_DATA[:10]]
+        for user in users:
+            trusted = User.trusted(user.dict())
+            assert trusted == user
+            assert trusted.__fields_set__ == user.__fields_set__
+        partial = PartialUser.trusted({"first_name": "Al", "email": "not an email"})
+        # no validation
+        assert partial.first_name == "Al"
+        assert partial.avatar is None
+
+    def test_user_validators(self):
+        user = {**INIT_DATA[0], "country_of_birth": "No"}
+        with mock.patch("api.api_v1.models.pydantic.validate_email"):
+            with pytest.raises(ValidationError) as error:
+                User.parse_obj(user)
+            [detail] = error.value.errors()
+            assert detail["loc"] == ("country_of_birth",)
+            user = User.parse_obj(
+                {
+                    **INIT_DATA[0],
+                    "email": "  John.Doe@Example.COM ",
+                    "avatar": " HTTPS://Robohash.org/A.png ",
+                }
+            )
+        assert user.email == "john.doe@example.com"
+        assert user.avatar == "https://robohash.org/a.png"
+        assert URL_PATTERN.match("www.example.com/a") is not None
+
+    def test_validate_many(self):
+        rows = [dict(user) for user in INIT_DATA[:50]]
+        changes = [
+            ("first_name", "Al"),
+            ("last_name", None),
+            ("job", None),
+            ("company", 42),
+            ("email", "  John.Doe@Example.COM "),
+            ("email", "john@doe"),
+            ("email", "jo..hn@doe.fr"),
+            ("avatar", None),
+            ("avatar", " HTTPS://Robohash.org/A.png "),
+            ("avatar", "robohash"),
+            ("gender", "male"),
+            ("gender", Gender.FEMALE),
+            ("date_of_birth", "1970-1-1"),
+            ("date_of_birth", date(1970, 1, 1)),
+            ("date_of_birth", "1970-02-30"),
+            ("is_admin", None),
+            ("is_admin", "true"),
+            ("country_of_birth", "No"),
+        ]
+        for row, (attribute, value) in zip(rows, changes):
+            row[attribute] = value
+        for row, attribute in zip(rows[30:], ("is_admin", "avatar", "email")):
+            del row[attribute]
+        rows += [None, "user", {}]
+
+        class Employee(User):
+            badge: int
+
+        for model in (User, PartialUser, PartialUserWithID, Employee):
+            expected_valid, expected_errors = {}, {}
+            for index, row in enumerate(rows):
+                try:
+                    expected_valid[index] = model.parse_obj(row).dict()
+                except ValidationError as e:
+                    expected_errors[index] = e.errors()
+            valid, errors = model.validate_many(rows)
+            assert valid == expected_valid
+            assert list(valid) == sorted(valid)
+            assert errors == expected_errors
+        valid, errors = User.validate_many(rows)
+        assert valid[2]["job"] is None
+        assert valid[4]["email"] == "john.doe@example.com"
+        assert valid[13]["date_of_birth"] == date(1970, 1, 1)
+        assert valid[30]["is_admin"] is False
+        [detail] = errors[0]
+        assert detail["loc"] == ("first_name",)
+        assert detail["msg"].startswith("first_name must contain between 3 and 50")
+        assert detail["type"] == "value_error"
+
+        # EMAIL_PATTERN matches are valid, the other emails are validated
+        for email in ("john.doe@example.com", "j_d+x@mail.sub-domain.fr"):
+            assert EMAIL_PATTERN.match(email) and email_error(email) is None
+        for email in ("j@ab--c.fr", "j@x.c0m", "j@doe", f"{'j' * 65}@doe.fr"):
+            assert EMAIL_PATTERN.match(email) is None
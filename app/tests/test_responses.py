@@ -0,0 +1,60 @@
+from datetime import date
+from unittest.mock import patch
+
+import pytest
+from fastapi import Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from tortoise.contrib import test
+
+from api.api_v1.models.types import Gender
+from api.api_v1.models.tortoise import Person_Pydantic
+from api.api_v1.responses import FastJSONResponse, fast_json_response, json_default
+from api.api_v1.storage.initial_data import INIT_DATA
+
+
+class TestResponses(test.TestCase):
+    def test_json_default(self):
+        user = Person_Pydantic(id=1, **INIT_DATA[0])
+        assert json_default(user) == user.dict()
+        assert json_default(Gender.MALE) == "Male"
+        assert json_default(date(1970, 1, 1)) == "1970-01-01"
+        with pytest.raises(TypeError):
+            json_default(object())
+
+    def test_fast_json_response(self):
+        content = {
+            "success": True,
+            "detail": "User 1 delete successfully ⭐",
+            "users": [
+                Person_Pydantic(id=n, **user)
+                for n, user in enumerate(INIT_DATA[:3], start=1)
+            ],
+            "user": {"gender": Gender.FEMALE, "date_of_birth": date(1970, 1, 1)},
+        }
+        expected = JSONResponse(jsonable_encoder(content)).body
+        assert FastJSONResponse(content).body == expected
+        with patch("api.api_v1.responses.orjson", None):
+            assert FastJSONResponse(content).body == expected
+
+    async def test_fast_json_response_decorator(self):
+        @fast_json_response(status.HTTP_202_ACCEPTED)
+        async def endpoint(res: Response, status_code: int):
+            res.status_code = status_code
+            res.headers["X-Total-Count"] = "1"
+            return {"gender": Gender.MALE}
+
+        for status_code, expected in ((None, 202), (404, 404)):
+            response = await endpoint(res=Response(), status_code=status_code)
+            assert isinstance(response, FastJSONResponse)
+            assert response.status_code == expected
+            assert response.body == b'{"gender":"Male"}'
+            assert response.headers["X-Total-Count"] == "1"
+            assert response.headers["content-length"] == "17"
+
+        @fast_json_response()
+        async def redirect(res: Response):
+            return Response(status_code=status.HTTP_301_MOVED_PERMANENTLY)
+
+        response = await redirect(res=Response())
+        assert response.status_code == status.HTTP_301_MOVED_PERMANENTLY
@@ -1,7 +1,12 @@
+from unittest.mock import AsyncMock, patch
+from datetime import date
+
 from fastapi import Request
 from tortoise.contrib import test
+from tortoise.exceptions import IntegrityError
 
 from api.utils import API_functools
+from api.api_v1.models.types import Gender
 from api.api_v1.models.tortoise import Person
 from api.api_v1.models.pydantic import User, PartialUser
 from api.api_v1.storage.initial_data import INIT_DATA
@@ -47,6 +52,32 @@ class TestUtils(test.TestCase):
         for order in orders:
             assert API_functools.valid_order(User, order[0]) == order[1]
 
+    def test_valid_fields(self):
+        scenes = [
+            ("first_name,last_name", ("id", "first_name", "last_name")),
+            (" Avatar , id,avatar", ("id", "avatar")),
+            ("id", ("id",)),
+            ("first_name,password", None),
+            ("first_name,", None),
+        ]
+        for fields, expected in scenes:
+            assert API_functools.valid_fields(User, fields) == expected
+        assert API_functools.valid_fields(PartialUser, "gender") is None
+
+    def test_page_url(self):
+        scope = {
+            "type": "http",
+            "path": "/users/",
+            "query_string": b"limit=2&offset=4&cursor=&sort=id:desc&fields=id,email",
+        }
+        request = Request(scope)
+        assert API_functools._page_url(request, 5, offset=10) == (
+            "/users/?limit=5&offset=10&sort=id%3Adesc&fields=id%2Cemail"
+        )
+        assert API_functools._page_url(request, 5, cursor="abc") == (
+            "/users/?limit=5&cursor=abc&sort=id%3Adesc&fields=id%2Cemail"
+        )
+
     def test_is_attribute_of(self):
         for attr in User.attributes():
             assert API_functools.is_attribute_of(attr, User) is True
@@ -91,10 +122,132 @@ class TestUtils(test.TestCase):
             actual = API_functools.manage_next_previous_page(request, [], *scene["data"])
             assert actual == scene["expected"]
 
+        # unknown total: next page exists if rows were found after the current one
+        scenes = [
+            ((5, 0, False), (None, None)),
+            ((5, 0, True), ("/?limit=5&offset=5", None)),
+            ((5, 5, True), ("/?limit=5&offset=10", "/?limit=5&offset=0")),
+            ((5, 5, False), (None, "/?limit=5&offset=0")),
+        ]
+        for (limit, offset, has_more), (next_page, previous_page) in scenes:
+            actual = API_functools.manage_next_previous_page(
+                request, [], None, limit, offset, has_more=has_more
+            )
+            assert actual == {"next": next_page, "previous": previous_page, "users": []}
+
+    def test_encode_decode_cursor(self):
+        person = {
+            "id": 3,
+            **INIT_DATA[0],
+            "gender": Gender(INIT_DATA[0]["gender"]),
+            "date_of_birth": date.fromisoformat(INIT_DATA[0]["date_of_birth"]),
+        }
+        scenes = [
+            ("id", 3),
+            ("-first_name", INIT_DATA[0]["first_name"]),
+            ("gender", INIT_DATA[0]["gender"]),
+            ("-date_of_birth", INIT_DATA[0]["date_of_birth"]),
+        ]
+        for order_by, value in scenes:
+            for backwards in (False, True):
+                cursor = API_functools.encode_cursor(order_by, person, backwards)
+                assert "=" not in cursor
+                assert API_functools.decode_cursor(User, cursor) == {
+                    "order_by": order_by,
+                    "value": value,
+                    "id": person["id"],
+                    "backwards": backwards,
+                }
+
+        # gender isn't a PartialUser attribute
+        cursor = API_functools.encode_cursor("gender", person)
+        assert API_functools.decode_cursor(PartialUser, cursor) is None
+        # not base64, not json, bad structure
+        for cursor in ("", "@", "bm90IGpzb24", "WzEsMiwzLDRd"):
+            assert API_functools.decode_cursor(User, cursor) is None
+
+    def test_manage_next_previous_cursor_page(self):
+        request = Request({"type": "http", "path": "/", "method": "GET"})
+        first = {"id": 1, **INIT_DATA[0]}
+        last = {"id": 2, **INIT_DATA[1]}
+        next_cursor = API_functools.encode_cursor("id", last)
+        previous_cursor = API_functools.encode_cursor("id", first, backwards=True)
+        forward = {"order_by": "id", "value": 0, "id": 0, "backwards": False}
+        backward = {**forward, "backwards": True}
+        scenes = [
+            # position, has_more, next, previous
+            (None, False, None, None),
+            (None, True, next_cursor, None),
+            (forward, False, None, previous_cursor),
+            (forward, True, next_cursor, previous_cursor),
+            (backward, False, next_cursor, None),
+            (backward, True, next_cursor, previous_cursor),
+        ]
+        for position, has_more, next_page, previous_page in scenes:
+            actual = API_functools.manage_next_previous_page(
+                request,
+                [first, last],
+                None,
+                2,
+                None,
+                order_by="id",
+                position=position,
+                has_more=has_more,
+            )
+            assert actual == {
+                "next": next_page and f"/?limit=2&cursor={next_page}",
+                "previous": previous_page and f"/?limit=2&cursor={previous_page}",
+                "users": [first, last],
+            }
+        actual = API_functools.manage_next_previous_page(
+            request, [], None, 2, None, order_by="id"
+        )
+        assert actual == {"next": None, "previous": None, "users": []}
+
     async def test_insert_default_data(self):
         nb_users_inserted = 4
-        await API_functools.insert_default_data(data=INIT_DATA[:nb_users_inserted])
+        report = await API_functools.insert_default_data(
+            data=INIT_DATA[:nb_users_inserted]
+        )
         assert await Person.all().count() == nb_users_inserted
+        assert report["rows"] == nb_users_inserted
+        assert report["rows_per_second"] > 0
+
+        # any iterable, read lazily, split in batches inserted concurrently
+        users = (user for user in INIT_DATA[10:])
+        with patch.object(Person, "bulk_create", wraps=Person.bulk_create) as bulk:
+            report = await API_functools.insert_default_data(
+                data=users, quantity=7, batch_size=3, concurrency=2
+            )
+        assert report["rows"] == 7
+        assert sorted(len(call.args[0]) for call in bulk.call_args_list) == [1, 3, 3]
+        assert next(users) == INIT_DATA[17]
+        emails = await Person.all().values_list("email", flat=True)
+        assert sorted(emails) == sorted(
+            user["email"] for user in INIT_DATA[:4] + INIT_DATA[10:17]
+        )
+
+        # emails are unique: stored users are skipped
+        with patch.object(Person, "create", AsyncMock(side_effect=IntegrityError())):
+            assert await API_functools._create_default_person(INIT_DATA[0]) is None
+
+        # a batch with a stored email is inserted again one person at a time
+        stored = INIT_DATA[0]["email"]
+
+        async def create(**user):
+            if user["email"] == stored:
+                raise IntegrityError()
+            return Person(**user)
+
+        with patch.object(
+            Person, "bulk_create", AsyncMock(side_effect=IntegrityError())
+        ), patch.object(Person, "create", side_effect=create):
+            report = await API_functools.insert_default_data(data=INIT_DATA[:3])
+        assert report["rows"] == 2
+
+        # nothing to insert
+        report = await API_functools.insert_default_data(data=[])
+        assert report == {"rows": 0, "seconds": report["seconds"], "rows_per_second": 0.0}
 
     async def test_create_default_person(self):
         user_to_create = INIT_DATA[0]